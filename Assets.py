@@ -0,0 +1,131 @@
+import cairo
+import json
+import os
+import threading
+import time
+
+ATLAS_INDEX = "atlas.json" #written by build_atlas.py
+
+#Images are only decoded the first time they are used (or by preload() in the background)
+#so importing the game does not pay for every PNG up front
+class AssetRegistry:
+    def __init__(self, atlas_index=ATLAS_INDEX):
+        self.start_time = time.perf_counter()
+        self.surfaces = {}
+        self.paths = []     #every registered image, in declaration order
+        self.sprite_paths = [] #the ones that may be packed into the atlas
+        self.atlas_index = atlas_index
+        self.atlas = None   #path -> (x, y, w, h) in the atlas image, once the index is read
+        self.atlas_image = None
+        self.sizes = {}     #sub-surfaces of the atlas can not tell their own size
+        self.lock = threading.Lock()
+        self.loader = None
+        self.decode_time = 0
+        self.marks = []
+
+    def register(self, path, sprite=False):
+        if path not in self.paths:
+            self.paths.append(path)
+        if sprite and path not in self.sprite_paths:
+            self.sprite_paths.append(path)
+
+    def load_atlas_index(self):
+        self.atlas = {}
+        if not os.path.exists(self.atlas_index):
+            return
+        with open(self.atlas_index) as index_file:
+            index = json.load(index_file)
+        for path, rectangle in index["sprites"].items():
+            self.atlas[path] = tuple(rectangle)
+        self.atlas_image_path = os.path.join(os.path.dirname(self.atlas_index), index["image"])
+
+    def decode(self, path):
+        if self.atlas == None:
+            self.load_atlas_index()
+        rectangle = self.atlas.get(os.path.normpath(path))
+        if rectangle == None:
+            return cairo.ImageSurface.create_from_png(path)
+        if self.atlas_image == None:
+            self.atlas_image = cairo.ImageSurface.create_from_png(self.atlas_image_path)
+        x, y, w, h = rectangle
+        surface = self.atlas_image.create_for_rectangle(x, y, w, h)
+        self.sizes[surface] = (w, h)
+        return surface
+
+    def get(self, path):
+        surface = self.surfaces.get(path)
+        if surface == None:
+            with self.lock:
+                surface = self.surfaces.get(path)
+                if surface == None:
+                    started = time.perf_counter()
+                    surface = self.decode(path)
+                    self.decode_time += time.perf_counter() - started
+                    self.surfaces[path] = surface
+        return surface
+
+    #Decodes everything registered so far in a background thread, e.g. while the menu is showing
+    def preload(self):
+        if self.loader == None:
+            self.loader = threading.Thread(target=self.load_all)
+            self.loader.daemon = True
+            self.loader.start()
+
+    def load_all(self):
+        for path in list(self.paths):
+            self.get(path)
+        self.mark("assets loaded")
+
+    def mark(self, event):
+        self.marks.append((event, time.perf_counter() - self.start_time))
+
+    def report(self):
+        lines = ["Startup timings (seconds since the asset registry was created):"]
+        for event, seconds in self.marks:
+            lines.append("  %-20s %.3f" % (event, seconds))
+        lines.append("  %d of %d images decoded in %.3f" % (len(self.surfaces), len(self.paths), self.decode_time))
+        return "\n".join(lines)
+
+
+registry = AssetRegistry()
+
+#Use these instead of get_width/get_height, sprites that come from the atlas are sub-surfaces
+def width(surface):
+    size = registry.sizes.get(surface)
+    return size[0] if size != None else surface.get_width()
+
+def height(surface):
+    size = registry.sizes.get(surface)
+    return size[1] if size != None else surface.get_height()
+
+#Class attribute that decodes its image on first access: CarModels.CORVETTE keeps working as before
+class Image:
+    def __init__(self, path):
+        self.path = path
+        registry.register(path, sprite=True)
+
+    def __get__(self, instance, owner):
+        return registry.get(self.path)
+
+class ImageTuple:
+    def __init__(self, *images):
+        self.images = images
+        self.surfaces = None
+
+    def __get__(self, instance, owner):
+        if self.surfaces == None:
+            self.surfaces = tuple(registry.get(image.path) for image in self.images)
+        return self.surfaces
+
+#Class attribute computed from other assets the first time it is read
+class Derived:
+    def __init__(self, function):
+        self.function = function
+        self.computed = False
+        self.value = None
+
+    def __get__(self, instance, owner):
+        if not self.computed:
+            self.value = self.function()
+            self.computed = True
+        return self.value
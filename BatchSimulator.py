@@ -0,0 +1,204 @@
+#Plays lots of headless games with bots on every core and sums them up, for tuning spawn rates, drop odds and penalties
+#  python BatchSimulator.py [--games N] [--ticks N] [--seed N] [--players 1|2] [--bot idle|random|dodger]
+#                           [--set name=value,value,...] [--processes N] [--output summary.json]
+#--set can be repeated, every combination of the values given is played --games times
+#  names: max_npvs, spawn_delay, truck_drop_rate, crash_penalty
+#Game N of every combination uses seed --seed + N so combinations are compared on the same games
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from Simulation import Simulation, Inputs, RoadPositions
+
+GAMES = 100
+TICKS = 60*Simulation.TICK_RATE #one minute of play
+SETTINGS = ("max_npvs", "spawn_delay", "truck_drop_rate", "crash_penalty")
+METRICS = ("score", "player_crashes", "npv_crashes", "power_ups_picked_up", "power_ups_used", "emitter_overflows")
+
+class IdleBot:
+    def __init__(self, player_id, rng):
+        self.player_id = player_id
+        self.random = rng
+
+    def inputs(self, simulation):
+        return []
+
+#Mashes random keys
+class RandomBot(IdleBot):
+    KEYS = (Inputs.BRAKE, Inputs.FORWARD, Inputs.UP, Inputs.DOWN)
+
+    def __init__(self, player_id, rng):
+        super(RandomBot, self).__init__(player_id, rng)
+        self.pressed = dict((key, False) for key in self.KEYS)
+
+    def inputs(self, simulation):
+        inputs = []
+        if self.random.randrange(30) == 0:
+            key = self.KEYS[self.random.randrange(len(self.KEYS))]
+            self.pressed[key] = not self.pressed[key]
+            inputs.append((self.player_id, key, self.pressed[key]))
+        if self.random.randrange(120) == 0:
+            inputs.append((self.player_id, Inputs.USE_POWER_UP, self.random.randrange(1, 6)))
+        return inputs
+
+#Drives forward, steers around whatever is right ahead and uses power ups as soon as it has them
+class DodgerBot(IdleBot):
+    LOOK_AHEAD = 250
+    LANE_WIDTH = RoadPositions.MIDDLE_LANE - RoadPositions.LEFT_LANE
+
+    def __init__(self, player_id, rng):
+        super(DodgerBot, self).__init__(player_id, rng)
+        self.up = False
+        self.down = False
+        self.forward = False
+
+    def blocked(self, simulation, player, y):
+        if y < RoadPositions.UPPER_LIMIT or y > RoadPositions.LOWER_LIMIT:
+            return True
+        x = player.horizontal_position
+        w = player.width + self.LOOK_AHEAD
+        for npv in simulation.npv_index.query(x, y, w, player.height):
+            if simulation.check_collision(x, y, w, player.height, npv.horizontal_position, npv.vertical_position, npv.width, npv.height):
+                return True
+        return False
+
+    def inputs(self, simulation):
+        player = simulation.players[self.player_id]
+        up = False
+        down = False
+        blocked = self.blocked(simulation, player, player.vertical_position)
+        if blocked:
+            up_free = not self.blocked(simulation, player, player.vertical_position - self.LANE_WIDTH)
+            down_free = not self.blocked(simulation, player, player.vertical_position + self.LANE_WIDTH)
+            if up_free and down_free:
+                up = self.random.randrange(2) == 0
+                down = not up
+            else:
+                up = up_free
+                down = down_free
+        inputs = []
+        for action, held, wanted in ((Inputs.UP, self.up, up), (Inputs.DOWN, self.down, down), (Inputs.FORWARD, self.forward, not blocked)):
+            if held != wanted:
+                inputs.append((self.player_id, action, wanted))
+        self.up = up
+        self.down = down
+        self.forward = not blocked
+        if len(player.inventory) > 0 and player.powerUpTimeOut == 0:
+            inputs.append((self.player_id, Inputs.USE_POWER_UP, 1))
+        return inputs
+
+BOTS = {"idle": IdleBot, "random": RandomBot, "dodger": DodgerBot}
+
+
+#Runs in a worker, config is a dict of players, bot, ticks and any of SETTINGS
+def play_game(arguments):
+    config, seed = arguments
+    simulation = Simulation(config["players"], max_npvs=config.get("max_npvs", Simulation.MAX_NPVS), spawn_delay=config.get("spawn_delay", Simulation.SPAWN_DELAY), seed=seed)
+    simulation.truck_drop_rate = config.get("truck_drop_rate", Simulation.TRUCK_DROP_RATE)
+    simulation.crash_penalty = config.get("crash_penalty", Simulation.CRASH_PENALTY)
+    #bots get their own generators so they do not change what the game rolls
+    bots = [BOTS[config["bot"]](player_id, random.Random("%d-%d" % (seed, player_id))) for player_id in range(config["players"])]
+    for tick in range(config["ticks"]):
+        inputs = []
+        for bot in bots:
+            inputs.extend(bot.inputs(simulation))
+        simulation.step(simulation.tick_length, inputs)
+    return {"score": sum(player.score for player in simulation.players) / len(simulation.players),
+            "player_crashes": simulation.player_crashes,
+            "npv_crashes": simulation.npv_crashes,
+            "power_ups_picked_up": simulation.power_ups_picked_up,
+            "power_ups_used": simulation.power_ups_used,
+            "emitter_overflows": simulation.particles.overflows}
+
+def silence():
+    #"Too many emitters!!" from thousands of games is of no use to anyone, the counters have it
+    sys.stdout = open(os.devnull, "w")
+
+def configurations(base, sweeps):
+    names = sorted(sweeps)
+    for values in itertools.product(*[sweeps[name] for name in names]):
+        config = dict(base)
+        config.update(zip(names, values))
+        yield config
+
+def run(configs, games, first_seed, processes=None):
+    jobs = [(config, first_seed + game) for config in configs for game in range(games)]
+    pool = multiprocessing.Pool(processes, initializer=silence)
+    try:
+        results = pool.map(play_game, jobs, chunksize=max(1, len(jobs) // (4 * (processes or multiprocessing.cpu_count()))))
+    finally:
+        pool.close()
+        pool.join()
+    return summarize(configs, games, results)
+
+def summarize(configs, games, results):
+    summary = []
+    for i, config in enumerate(configs):
+        games_results = results[i*games : (i+1)*games]
+        row = {"config": config, "games": len(games_results)}
+        for metric in METRICS:
+            values = [result[metric] for result in games_results]
+            row[metric] = {"mean": sum(values) / float(len(values)), "min": min(values), "max": max(values)}
+        summary.append(row)
+    return summary
+
+def print_table(summary, swept):
+    header = "".join("%-16s" % name for name in swept) + "%8s" % "games" + "".join("%20s" % metric for metric in METRICS)
+    print(header)
+    for row in summary:
+        line = "".join("%-16s" % row["config"][name] for name in swept) + "%8d" % row["games"]
+        for metric in METRICS:
+            line += "%20.2f" % row[metric]["mean"]
+        print(line)
+
+def main(args):
+    base = {"players": 1, "bot": "dodger", "ticks": TICKS}
+    sweeps = {}
+    games = GAMES
+    first_seed = 0
+    processes = None
+    output = None
+    i = 0
+    while i + 1 < len(args):
+        flag, value = args[i], args[i+1]
+        if flag == "--games":
+            games = int(value)
+        elif flag == "--ticks":
+            base["ticks"] = int(value)
+        elif flag == "--seed":
+            first_seed = int(value)
+        elif flag == "--players":
+            base["players"] = int(value)
+        elif flag == "--bot" and value in BOTS:
+            base["bot"] = value
+        elif flag == "--set" and value.split("=")[0] in SETTINGS:
+            name, values = value.split("=")
+            sweeps[name] = [float(number) if "." in number else int(number) for number in values.split(",")]
+        elif flag == "--processes":
+            processes = int(value)
+        elif flag == "--output":
+            output = value
+        else:
+            print("Bad argument " + flag + " " + value + "!!")
+            return 2
+        i += 2
+    if i != len(args):
+        print("Missing value for " + args[-1] + "!!")
+        return 2
+
+    configs = list(configurations(base, sweeps))
+    started = time.perf_counter()
+    summary = run(configs, games, first_seed, processes)
+    print("%d games in %.1fs" % (len(configs) * games, time.perf_counter() - started))
+    print_table(summary, sorted(sweeps))
+    if output != None:
+        with open(output, "w") as output_file:
+            json.dump(summary, output_file, indent=1, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
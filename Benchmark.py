@@ -0,0 +1,255 @@
+#Runs scripted scenarios through the Simulation without a window, drawing every frame into an ImageSurface
+#  python Benchmark.py [--scenario NAME ...] [--steps N] [--output results.json] [--baseline baseline.json] [--threaded-render]
+#                    [--governor] [--budget MS]
+#--threaded-render runs every scenario twice, drawing on this thread and through the LayerRenderer, and reports how much faster the frames got
+#Exits with 1 if any scenario got slower than the baseline by more than the tolerance
+import cairo
+import json
+import sys
+import time
+import tracemalloc
+
+import Simulation
+from LayerRenderer import LayerRenderer
+from Profiler import percentile
+from QualityGovernor import QualityGovernor
+from Simulation import Window, Inputs, RoadPositions, Speed, CarModels, PowerUps, NPV, SmokeEmitter
+from Simulation import Call911, Hydraulics, Shield, Shrink, Phaser
+
+WARMUP_STEPS = 300  #lets the traffic arrive from beyond the horizon before measuring
+MEASURED_STEPS = 600
+SEED = 1
+TOLERANCE = 0.10    #fraction a result may get worse than the baseline before it counts as a regression
+
+LANES = (RoadPositions.LEFT_LANE, RoadPositions.MIDDLE_LANE, RoadPositions.RIGHT_LANE)
+
+class Scenario:
+    def __init__(self, name, players=1, max_npvs=Simulation.Simulation.MAX_NPVS, spawn_delay=Simulation.Simulation.SPAWN_DELAY, tick=None):
+        self.name = name
+        self.players = players
+        self.max_npvs = max_npvs
+        self.spawn_delay = spawn_delay
+        self.tick = tick    #called with the simulation before every step
+        self.governor_budget = None     #--governor runs every scenario under a QualityGovernor with this budget
+
+    def create(self, seed):
+        return Simulation.Simulation(self.players, max_npvs=self.max_npvs, spawn_delay=self.spawn_delay, seed=seed)
+
+
+def weave(simulation):
+    #players steer up and down a lane every second so they keep moving through the traffic
+    if simulation.ticks % 60 == 0:
+        going_up = (simulation.ticks // 60) % 2 == 0
+        for player in simulation.players:
+            simulation.apply_input(player.player_id, Inputs.UP, going_up)
+            simulation.apply_input(player.player_id, Inputs.DOWN, not going_up)
+
+def particle_storm(simulation):
+    particles = simulation.particles
+    rng = simulation.random
+    while len(particles.emitters) < particles.max_emitters:
+        particles.add_new_emmitter(particles.new_emitter(SmokeEmitter, rng.randrange(Window.WIDTH), rng.randrange(RoadPositions.UPPER_LIMIT, RoadPositions.LOWER_LIMIT), -Speed.MAX_SPEED, 0))
+
+def all_power_ups(simulation):
+    weave(simulation)
+    for player in simulation.players:
+        if player.powerUpTimeOut == 0:
+            for kind in (Call911, Hydraulics, Shield, Shrink, Phaser):
+                power_up = simulation.pools.acquire(kind, simulation, player)
+                power_up.execute()
+                simulation.pools.release(power_up)
+        while len(player.inventory) < PowerUps.INVENTORY_SIZE:
+            player.addPowerUp(simulation.pools.acquire(Shield, simulation, player))
+
+def crash_pileup(simulation):
+    #every three seconds a tight pack of cars at different speeds appears right in front of the players
+    weave(simulation)
+    if simulation.ticks % 180 != 0:
+        return
+    rng = simulation.random
+    for lane in LANES:
+        for i in range(10):
+            npv = simulation.new_npv(NPV, CarModels.AVAILABLE_CARS[rng.randrange(len(CarModels.AVAILABLE_CARS))], lane, Speed.MAX_SPEED - Speed.ONE_KMH*rng.randrange(5, 40), rng)
+            npv.horizontal_position = 400 + i*60 + rng.randrange(-20, 20)
+            npv.save_state()
+            simulation.spawn_npv(npv)
+
+SCENARIOS = [
+    Scenario("idle_road", max_npvs=0),
+    Scenario("traffic_8", max_npvs=8, spawn_delay=0),
+    Scenario("traffic_50", max_npvs=50, spawn_delay=0),
+    Scenario("traffic_200", max_npvs=200, spawn_delay=0),
+    Scenario("particle_storm", tick=particle_storm),
+    Scenario("two_players_all_power_ups", players=2, tick=all_power_ups),
+    Scenario("crash_pileup", players=2, max_npvs=0, tick=crash_pileup),
+]
+
+def object_allocations(simulation):
+    return simulation.pools.allocations() + simulation.particles.emitter_pools.allocations()
+
+def draw(simulation, cr, renderer):
+    if renderer != None:
+        renderer.draw(simulation, cr)
+    else:
+        simulation.draw(cr)
+
+def play(scenario, steps, seed, measure=None, renderer=None):
+    #Runs the scenario for WARMUP_STEPS + steps frames, calls measure(simulation, cr) for each measured one
+    #Returns the simulation and how many game objects were allocated during the measured frames
+    simulation = scenario.create(seed)
+    warmup_allocations = 0
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, Window.WIDTH, Window.HEIGHT)
+    cr = cairo.Context(surface)
+    for i in range(WARMUP_STEPS + steps):
+        if i == WARMUP_STEPS and measure != None:
+            simulation.profiler.enabled = True
+            warmup_allocations = object_allocations(simulation)
+        if scenario.tick != None:
+            scenario.tick(simulation)
+        if i >= WARMUP_STEPS and measure != None:
+            measure(simulation, cr)
+        else:
+            simulation.step(simulation.tick_length)
+            draw(simulation, cr, renderer)
+    return simulation, object_allocations(simulation) - warmup_allocations
+
+#renderer is a LayerRenderer, None draws on this thread like the game always did
+def run(scenario, steps=MEASURED_STEPS, seed=SEED, memory=True, renderer=None):
+    step_times = []
+    frame_times = []
+    governor = QualityGovernor(scenario.governor_budget) if scenario.governor_budget != None else None
+
+    def measure(simulation, cr):
+        if governor != None and len(frame_times) > 0:
+            level = governor.frame(frame_times[-1])
+            if level != None:
+                simulation.apply_input(0, Inputs.QUALITY, level)
+        started = time.perf_counter()
+        simulation.step(simulation.tick_length)
+        stepped = time.perf_counter()
+        draw(simulation, cr, renderer)
+        surface = cr.get_target()
+        surface.flush()
+        finished = time.perf_counter()
+        simulation.profiler.end_frame()
+        step_times.append((stepped - started) * 1000)
+        frame_times.append((finished - started) * 1000)
+
+    simulation, allocations = play(scenario, steps, seed, measure, renderer)
+    frame_times.sort()
+    result = {"steps": steps,
+              "steps_per_second": len(step_times) / (sum(step_times) / 1000) if sum(step_times) > 0 else 0,
+              "frames_per_second": len(frame_times) / (sum(frame_times) / 1000) if sum(frame_times) > 0 else 0,
+              "frame_ms": {"mean": sum(frame_times) / len(frame_times),
+                           "p50": percentile(frame_times, 0.50),
+                           "p95": percentile(frame_times, 0.95),
+                           "p99": percentile(frame_times, 0.99),
+                           "max": frame_times[-1]},
+              "phases_ms": dict((phase, {"mean": mean, "p95": p95, "p99": p99}) for phase, (mean, p95, p99) in simulation.profiler.statistics().items()),
+              "npvs": len(simulation.npvs),
+              "emitters": len(simulation.particles.emitters),
+              "particle_pool": simulation.particles.pool.statistics(),
+              "object_allocations": allocations, #game objects created while measuring, 0 once the pools are warm
+              "object_pools": simulation.pools.statistics(),
+              "emitter_pools": simulation.particles.emitter_pools.statistics()}
+    if governor != None:
+        result["quality"] = governor.statistics()
+
+    if memory:
+        #A second run of the same game with tracemalloc on, it slows everything down too much to time with
+        tracemalloc.start()
+        play(scenario, steps, seed, renderer=renderer)
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old == None:
+            continue
+        if result["steps_per_second"] < old["steps_per_second"] * (1 - tolerance):
+            regressions.append("%s: %.0f steps/s, baseline %.0f" % (name, result["steps_per_second"], old["steps_per_second"]))
+        if result["frame_ms"]["p95"] > old["frame_ms"]["p95"] * (1 + tolerance):
+            regressions.append("%s: p95 frame %.3fms, baseline %.3fms" % (name, result["frame_ms"]["p95"], old["frame_ms"]["p95"]))
+        if "peak_memory_bytes" in result and "peak_memory_bytes" in old and result["peak_memory_bytes"] > old["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append("%s: peak memory %d bytes, baseline %d" % (name, result["peak_memory_bytes"], old["peak_memory_bytes"]))
+    return regressions
+
+def report(name, result):
+    print("%-28s %9.0f steps/s %7.1f fps   frame p50 %7.3fms p95 %7.3fms p99 %7.3fms" % (name, result["steps_per_second"], result["frames_per_second"],
+          result["frame_ms"]["p50"], result["frame_ms"]["p95"], result["frame_ms"]["p99"]))
+    if "quality" in result:
+        print("%-28s quality level %d, %d transitions, frames per level %s" % ("", result["quality"]["level"], len(result["quality"]["transitions"]), result["quality"]["frames_at_level"]))
+
+def main(args):
+    names = []
+    steps = MEASURED_STEPS
+    output = None
+    baseline = None
+    memory = True
+    threaded = False
+    i = 0
+    while i < len(args):
+        if args[i] == "--scenario":
+            names.append(args[i+1])
+            i += 1
+        elif args[i] == "--steps":
+            steps = int(args[i+1])
+            i += 1
+        elif args[i] == "--output":
+            output = args[i+1]
+            i += 1
+        elif args[i] == "--baseline":
+            baseline = args[i+1]
+            i += 1
+        elif args[i] == "--no-memory":
+            memory = False
+        elif args[i] == "--governor":
+            for scenario in SCENARIOS:
+                scenario.governor_budget = scenario.governor_budget or QualityGovernor.BUDGET
+        elif args[i] == "--budget":
+            for scenario in SCENARIOS:
+                scenario.governor_budget = float(args[i+1])
+            i += 1
+        elif args[i] == "--threaded-render":
+            threaded = True
+        else:
+            print("Unknown argument " + args[i] + "!!")
+            return 2
+        i += 1
+
+    renderer = LayerRenderer(Window.WIDTH, Window.HEIGHT) if threaded else None
+    results = {}
+    for scenario in SCENARIOS:
+        if len(names) > 0 and scenario.name not in names:
+            continue
+        results[scenario.name] = run(scenario, steps, memory=memory)
+        result = results[scenario.name]
+        report(scenario.name, result)
+        if renderer != None:
+            #The baseline keeps comparing the single threaded numbers, the threaded ones ride along
+            result["threaded"] = run(scenario, steps, memory=memory, renderer=renderer)
+            result["threaded_speedup"] = result["frame_ms"]["mean"] / result["threaded"]["frame_ms"]["mean"]
+            report(scenario.name + " threaded", result["threaded"])
+            print("%-28s frames %.2fx faster threaded" % ("", result["threaded_speedup"]))
+
+    if renderer != None:
+        renderer.shutdown()
+
+    if output != None:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=1, sort_keys=True)
+
+    if baseline != None:
+        with open(baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file))
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if len(regressions) > 0:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+#Every NPV, dropped item, emitter and crash handler of a game lives here, each kind in its own group
+#A group is a plain dense list so iterating it costs the same as before, but never append to or remove from it directly:
+#  spawn adds to the end, despawn only marks the entity and compact() takes every marked one out in one pass,
+#  moving the last entity of the group into the hole so nothing has to shift down
+#Despawned entities stay in their list until compact(), use alive/live/count when that matters
+#Handles are (slot, generation) pairs, they stop resolving as soon as their entity is despawned even if the slot gets reused
+class EntityStore:
+    def __init__(self):
+        #per slot
+        self.entities = []
+        self.generations = []   #bumped every time the slot's entity is despawned
+        self.groups = []
+        self.positions = []     #where the entity is in its group's list
+        self.free = []
+        self.slot_of = {}       #live entity -> slot
+        #per group
+        self.lists = {}
+        self.list_slots = {}    #slot of every entity in the list, in the same order
+        self.pending_counts = {}
+        self.released = {}      #called with every entity compact() takes out of the group
+        self.pending = []       #despawned slots, in the order they were despawned
+
+    #The group's list, created empty the first time it is asked for
+    def group(self, name, released=None):
+        if name not in self.lists:
+            self.lists[name] = []
+            self.list_slots[name] = []
+            self.pending_counts[name] = 0
+        if released != None:
+            self.released[name] = released
+        return self.lists[name]
+
+    def spawn(self, name, entity):
+        entities = self.group(name)
+        if len(self.free) > 0:
+            slot = self.free.pop()
+        else:
+            slot = len(self.entities)
+            self.entities.append(None)
+            self.generations.append(0)
+            self.groups.append(None)
+            self.positions.append(0)
+        self.entities[slot] = entity
+        self.groups[slot] = name
+        self.positions[slot] = len(entities)
+        entities.append(entity)
+        self.list_slots[name].append(slot)
+        self.slot_of[entity] = slot
+        return (slot, self.generations[slot])
+
+    #Returns False if entity was not alive
+    def despawn(self, entity):
+        slot = self.slot_of.pop(entity, None)
+        if slot == None:
+            return False
+        self.generations[slot] += 1
+        self.pending.append(slot)
+        self.pending_counts[self.groups[slot]] += 1
+        return True
+
+    def alive(self, entity):
+        return entity in self.slot_of
+
+    def handle_of(self, entity):
+        slot = self.slot_of.get(entity)
+        if slot == None:
+            return None
+        return (slot, self.generations[slot])
+
+    #The entity behind handle, None once it has been despawned
+    def get(self, handle):
+        slot, generation = handle
+        if slot >= len(self.entities) or self.generations[slot] != generation:
+            return None
+        return self.entities[slot]
+
+    #How many entities of the group are alive
+    def count(self, name):
+        return len(self.group(name)) - self.pending_counts[name]
+
+    #The group without the entities despawned since the last compact()
+    def live(self, name):
+        entities = self.group(name)
+        if self.pending_counts[name] == 0:
+            return entities
+        return [entity for entity in entities if entity in self.slot_of]
+
+    def compact(self):
+        pending = self.pending
+        if len(pending) == 0:
+            return
+        self.pending = []
+        for slot in pending:
+            name = self.groups[slot]
+            entities = self.lists[name]
+            slots = self.list_slots[name]
+            position = self.positions[slot]
+            last = entities.pop()
+            last_slot = slots.pop()
+            if last_slot != slot:
+                entities[position] = last
+                slots[position] = last_slot
+                self.positions[last_slot] = position
+            entity = self.entities[slot]
+            self.entities[slot] = None
+            self.groups[slot] = None
+            self.free.append(slot)
+            self.pending_counts[name] -= 1
+            released = self.released.get(name)
+            if released != None:
+                released(entity)
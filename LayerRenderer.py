@@ -0,0 +1,46 @@
+import cairo
+from concurrent.futures import ThreadPoolExecutor
+
+#Paints Simulation.layers() at the same time on a pool of threads, each into its own ARGB surface,
+#then composites them in order over the bottom layer, which is painted straight onto the target meanwhile
+#pycairo lets go of the GIL while cairo rasterizes so the layers really do overlap on multicore machines
+#Layers must only read the game state, and the state must not change until draw() returns
+class LayerRenderer:
+    def __init__(self, width, height, threads=None):
+        self.width = width
+        self.height = height
+        self.executor = None
+        self.threads = threads  #None is one per layer
+        self.surfaces = []      #one per layer above the bottom one, reused every frame
+
+    def draw(self, simulation, cr, alpha=1):
+        layers = simulation.layers()
+        profiler = simulation.profiler
+        t = profiler.start()
+        if self.executor == None:
+            self.executor = ThreadPoolExecutor(self.threads if self.threads != None else len(layers) - 1)
+        while len(self.surfaces) < len(layers) - 1:
+            self.surfaces.append(cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height))
+
+        jobs = [self.executor.submit(self.paint_layer, self.surfaces[i], layer, alpha) for i, (phase, layer) in enumerate(layers[1:])]
+        phase, bottom = layers[0]
+        bottom(cr, alpha)
+        t = profiler.lap(phase, t)
+        for job in jobs:
+            cr.set_source_surface(job.result(), 0, 0)
+            cr.paint()
+        profiler.lap("draw layers", t)
+
+    def paint_layer(self, surface, layer, alpha):
+        cr = cairo.Context(surface)
+        cr.set_operator(cairo.OPERATOR_CLEAR)
+        cr.paint()
+        cr.set_operator(cairo.OPERATOR_OVER)
+        layer(cr, alpha)
+        surface.flush()
+        return surface
+
+    def shutdown(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,53 @@
+#Reuses game objects instead of allocating new ones for every spawn, drop and crash
+#Pooled classes need a reset method taking the same arguments as their constructor
+class ObjectPool:
+    def __init__(self, kind):
+        self.kind = kind
+        self.free = []
+        self.allocations = 0    #objects created because none were free
+        self.reuses = 0
+        self.releases = 0
+
+    def acquire(self, *args):
+        if len(self.free) > 0:
+            obj = self.free.pop()
+            obj.reset(*args)
+            self.reuses += 1
+            return obj
+        self.allocations += 1
+        return self.kind(*args)
+
+    #obj must not be used by anyone once it is back in the pool
+    def release(self, obj):
+        self.free.append(obj)
+        self.releases += 1
+
+    def statistics(self):
+        return {"allocations": self.allocations,
+                "reuses": self.reuses,
+                "releases": self.releases,
+                "free": len(self.free)}
+
+
+#One ObjectPool per class, created the first time that class is acquired
+class Pools:
+    def __init__(self):
+        self.pools = {}
+
+    def acquire(self, kind, *args):
+        pool = self.pools.get(kind)
+        if pool == None:
+            pool = ObjectPool(kind)
+            self.pools[kind] = pool
+        return pool.acquire(*args)
+
+    def release(self, obj):
+        pool = self.pools.get(type(obj))
+        if pool != None:
+            pool.release(obj)
+
+    def allocations(self):
+        return sum(pool.allocations for pool in self.pools.values())
+
+    def statistics(self):
+        return dict((kind.__name__, pool.statistics()) for kind, pool in self.pools.items())
@@ -1,22 +1,46 @@
-import cairo
+import math
+import random
+
+import SpriteCache
+import Assets
+import ObjectPool
+import EntityStore
+from Assets import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class PoolPolicies:
+    FIXED = 0           #requests fail once the pool is empty
+    GROW = 1            #allocate POOL_GROWTH_CHUNK more particles
+    EVICT_OLDEST = 2    #take the particle that has been in use the longest from its emitter
 
 class Particles:
-    SMOKE = cairo.ImageSurface.create_from_png("./smoke_particle.png")
-    FIRE = cairo.ImageSurface.create_from_png("./fire.png")
-    POINTS = cairo.ImageSurface.create_from_png("./points.png")
-    PLUS_100_POINTS = cairo.ImageSurface.create_from_png("./plus100points.png")
-    MINUS_100_POINTS = cairo.ImageSurface.create_from_png("./minus100points.png")
-    HOLY_SHIT = cairo.ImageSurface.create_from_png("./holy.png")
-    MAYHEM = cairo.ImageSurface.create_from_png("./mayhem.png")
-    ANNIHILATION = cairo.ImageSurface.create_from_png("./annihilation.png")
+    SMOKE = Image("./smoke_particle.png")
+    FIRE = Image("./fire.png")
+    POINTS = Image("./points.png")
+    PLUS_100_POINTS = Image("./plus100points.png")
+    MINUS_100_POINTS = Image("./minus100points.png")
+    HOLY_SHIT = Image("./holy.png")
+    MAYHEM = Image("./mayhem.png")
+    ANNIHILATION = Image("./annihilation.png")
     MAX_EMMITTERS = 20 
     POOLED_PARTICLES = 400
+    POOL_POLICY = PoolPolicies.FIXED
+    POOL_GROWTH_CHUNK = 100
+    VECTORIZED = False #Use the numpy backend (VectorParticlePool) when numpy is available
     WIDTH = 64
     HEIGHT = 64
 
 
 class Particle:
+    __slots__ = ("owner", "x", "y", "life", "original_life", "angle", "speed_x", "speed_y", "size", "original_size",
+                 "shape", "alpha", "deflate", "previous_x", "previous_y")
+
     def __init__(self, x=0, y=0, life=0, angle=0, speed_x=0, speed_y=0, size=0, shape=None, deflate=True):
+        self.owner = None
         self.set_properties(x, y, life, angle, speed_x, speed_y, size, shape, deflate)
 
     def set_properties(self, x, y, life, angle, speed_x, speed_y, size, shape, deflate):
@@ -32,6 +56,8 @@ class Particle:
         self.shape = shape
         self.alpha = 1
         self.deflate = deflate
+        self.previous_x = x
+        self.previous_y = y
 
     def update(self, time_delta):
         self.life -= time_delta
@@ -43,57 +69,243 @@ class Particle:
                 self.size = self.original_size / age_ratio if age_ratio > 0.5 else self.size
             self.alpha = age_ratio
 
+            self.previous_x = self.x
+            self.previous_y = self.y
             self.x += self.speed_x * time_delta
             self.y += self.speed_y * time_delta
 
-    def draw(self, cr):
-        cr.save()
-        cr.translate(self.x, self.y)
-        cr.scale(self.size/Particles.WIDTH , self.size/ Particles.HEIGHT)
-        cr.set_source_surface(self.shape, 0, 0)
-        cr.paint_with_alpha(self.alpha)
-        cr.restore()
+    def draw(self, cr, alpha=1, filter=None):
+        SpriteCache.draw(cr, self.shape, self.previous_x + (self.x - self.previous_x)*alpha, self.previous_y + (self.y - self.previous_y)*alpha,
+                         0, self.size/Particles.WIDTH, self.size/Particles.HEIGHT, self.alpha, filter)
 
 class ParticlePool:
-    def __init__(self, pool_size):
-        self.pool_size = pool_size
-        self.pool = [ Particle() for i in range(pool_size) ] 
-        self.ready_particle_count = pool_size
-
-    def request_particle(self):
-        if self.ready_particle_count == 0:
-            print("Available particles limit EXCEEDED!!!")
-            return None
-        particle = self.pool[self.ready_particle_count-1]
-        self.ready_particle_count -= 1
+    def __init__(self, pool_size, policy=Particles.POOL_POLICY, growth_chunk=Particles.POOL_GROWTH_CHUNK):
+        self.policy = policy
+        self.growth_chunk = growth_chunk
+        self.pool = []      #every particle ever allocated
+        self.free = []      #stack of the ready particles
+        self.in_use = {}    #particles handed out, oldest first (dicts keep insertion order)
+
+        #Statistics, to size the pool from real games
+        self.allocations = 0
+        self.requests = 0
+        self.peak_usage = 0
+        self.exhaustion_events = 0
+        self.evictions = 0
+
+        self.grow(pool_size)
+
+    @property
+    def pool_size(self):
+        return len(self.pool)
+
+    @property
+    def ready_particle_count(self):
+        return len(self.free)
+
+    def create_particles(self, count):
+        return [ Particle() for i in range(count) ]
+
+    def grow(self, count):
+        particles = self.create_particles(count)
+        self.pool.extend(particles)
+        self.free.extend(reversed(particles))
+        self.allocations += count
+
+    def request_particle(self, owner=None):
+        if len(self.free) == 0:
+            self.exhaustion_events += 1
+            if self.policy == PoolPolicies.GROW:
+                self.grow(self.growth_chunk)
+            elif self.policy == PoolPolicies.EVICT_OLDEST and len(self.in_use) > 0:
+                self.evict_oldest()
+            else:
+                print("Available particles limit EXCEEDED!!!")
+                return None
+        particle = self.free.pop()
+        particle.owner = owner
+        self.in_use[particle] = None
+        self.requests += 1
+        if len(self.in_use) > self.peak_usage:
+            self.peak_usage = len(self.in_use)
         return particle
 
     def return_particle(self, returning_particle):
-        moved_particle = self.pool[self.ready_particle_count]
-        position_to_move_into = self.pool.index(returning_particle)
-        self.pool[self.ready_particle_count] = returning_particle
-        self.pool[position_to_move_into] = moved_particle
-        self.ready_particle_count += 1
+        del self.in_use[returning_particle]
+        returning_particle.owner = None
+        self.free.append(returning_particle)
+
+    def evict_oldest(self):
+        particle = next(iter(self.in_use))
+        owner = particle.owner
+        if owner != None:
+            owner.particles.remove(particle)
+            self.owner_changed(owner)
+        self.return_particle(particle)
+        self.evictions += 1
+
+    #hook for pools that keep per emitter bookkeeping
+    def owner_changed(self, owner):
+        pass
+
+    def statistics(self):
+        return {"size": self.pool_size,
+                "in_use": len(self.in_use),
+                "peak_usage": self.peak_usage,
+                "requests": self.requests,
+                "allocations": self.allocations,
+                "exhaustion_events": self.exhaustion_events,
+                "evictions": self.evictions}
+
+
+def array_property(name):
+    return property(lambda self: getattr(self.pool, name)[self.index],
+                    lambda self, value: getattr(self.pool, name).__setitem__(self.index, value))
+
+#Stand-in for a Particle whose state lives in the arrays of a VectorParticlePool
+#so that the emitters' set_particles keep working unchanged
+class ParticleView:
+    x = array_property("x")
+    y = array_property("y")
+    previous_x = array_property("previous_x")
+    previous_y = array_property("previous_y")
+    life = array_property("life")
+    original_life = array_property("original_life")
+    angle = array_property("angle")
+    speed_x = array_property("speed_x")
+    speed_y = array_property("speed_y")
+    size = array_property("size")
+    original_size = array_property("original_size")
+    alpha = array_property("alpha")
+    deflate = array_property("deflate")
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.owner = None
+
+    @property
+    def shape(self):
+        return self.pool.shapes[self.index]
+
+    def set_properties(self, x, y, life, angle, speed_x, speed_y, size, shape, deflate):
+        pool = self.pool
+        i = self.index
+        pool.x[i] = pool.previous_x[i] = x
+        pool.y[i] = pool.previous_y[i] = y
+        pool.life[i] = pool.original_life[i] = life
+        pool.angle[i] = angle
+        pool.speed_x[i] = speed_x
+        pool.speed_y[i] = speed_y
+        pool.size[i] = pool.original_size[i] = size
+        pool.alpha[i] = 1
+        pool.deflate[i] = deflate
+        pool.shapes[i] = shape
+
+class VectorParticlePool(ParticlePool):
+    #Structure of arrays: every pooled particle is one slot in each array
+    #and all the live ones are advanced together in update()
+    ARRAYS = ("x", "y", "previous_x", "previous_y", "life", "original_life", "angle",
+              "speed_x", "speed_y", "size", "original_size", "alpha")
+
+    def __init__(self, pool_size, policy=Particles.POOL_POLICY, growth_chunk=Particles.POOL_GROWTH_CHUNK):
+        for name in self.ARRAYS:
+            setattr(self, name, numpy.zeros(0))
+        self.deflate = numpy.zeros(0, dtype=bool)
+        self.emitting = numpy.zeros(0, dtype=bool)
+        self.shapes = []
+        super(VectorParticlePool, self).__init__(pool_size, policy, growth_chunk)
+
+    def create_particles(self, count):
+        start = len(self.pool)
+        return [ ParticleView(self, i) for i in range(start, start + count) ]
+
+    def grow(self, count):
+        #Views only keep their index so they stay valid when the arrays are replaced
+        for name in self.ARRAYS:
+            setattr(self, name, numpy.concatenate((getattr(self, name), numpy.zeros(count))))
+        self.alpha[-count:] = 1
+        self.deflate = numpy.concatenate((self.deflate, numpy.ones(count, dtype=bool)))
+        self.emitting = numpy.concatenate((self.emitting, numpy.zeros(count, dtype=bool)))
+        self.shapes.extend([None] * count)
+        super(VectorParticlePool, self).grow(count)
+
+    def owner_changed(self, owner):
+        owner.particle_indices = self.indices_of(owner.particles)
+
+    def indices_of(self, particles):
+        return numpy.array([particle.index for particle in particles], dtype=numpy.intp)
+
+    #Same rules as ParticleEmitter.update, only an emitter's waiting particles are started
+    #at its rate and it is done once none of its particles are alive
+    def update(self, emitters, time_delta):
+        life = self.life
+        original_life = self.original_life
+        self.emitting[:] = False
+        for emitter in emitters:
+            idx = emitter.particle_indices
+            waiting = idx[(life[idx] > 0) & (life[idx] >= original_life[idx])]
+            self.emitting[waiting[:max(0, int(math.ceil(emitter.rate*time_delta)))]] = True
+
+        active = (life > 0) & ((life < original_life) | self.emitting)
+        idx = numpy.flatnonzero(active)
+        life[idx] -= time_delta
+        alive = idx[life[idx] > 0]
+        age_ratio = life[alive] / original_life[alive]
+        grown_size = numpy.where(self.deflate[alive], self.original_size[alive] * age_ratio, self.original_size[alive] / age_ratio)
+        self.size[alive] = numpy.where(age_ratio > 0.5, grown_size, self.size[alive])
+        self.alpha[alive] = age_ratio
+        self.previous_x[alive] = self.x[alive]
+        self.previous_y[alive] = self.y[alive]
+        self.x[alive] += self.speed_x[alive] * time_delta
+        self.y[alive] += self.speed_y[alive] * time_delta
+
+        for emitter in emitters:
+            if not active[emitter.particle_indices].any():
+                for particle in emitter.particles:
+                    self.return_particle(particle)
+                emitter.done = True
+
+    def live_indices(self, emitter):
+        idx = emitter.particle_indices
+        return idx[self.life[idx] > 0].tolist()
+
+    def draw(self, emitters, cr, alpha=1, filter=None):
+        for emitter in emitters:
+            if emitter.done:
+                continue
+            for i in self.live_indices(emitter):
+                size = float(self.size[i])
+                SpriteCache.draw(cr, self.shapes[i], float(self.previous_x[i] + (self.x[i] - self.previous_x[i])*alpha), float(self.previous_y[i] + (self.y[i] - self.previous_y[i])*alpha),
+                                 0, size/Particles.WIDTH, size/Particles.HEIGHT, float(self.alpha[i]), filter)
 
 class ParticleEmitter:
     def __init__(self, x, y, speed_x, speed_y, size, shape, num_of_particles, rate):
-        global __particlePool__
         self.x = x
         self.y = y
         self.speed_x = speed_x
         self.speed_y = speed_y
         self.size = size
         self.shape = shape
-        self.pool = __particlePool__
+        self.pool = None #Assigned by the ParticleSystem that accepts this emitter
+        self.random = random #and so is the game's random.Random
         self.particles = []
         self.particle_count = num_of_particles
         self.rate = rate
         self.done = False
 
+    #Emitters are pooled by the ParticleSystem, a reused one takes its constructor's arguments again
+    def reset(self, *args):
+        self.__init__(*args)
 
     #Must be outside of constructor so that particles are only reserved after emitter is aproved
     def init_particles(self):
-        self.particles = [self.pool.request_particle() for i in range(self.particle_count)]
+        self.particles = []
+        for i in range(self.particle_count):
+            particle = self.pool.request_particle(self)
+            if particle == None: #pool exhausted, make do with what we got
+                break
+            self.particles.append(particle)
         self.set_particles()
 
     #abstract
@@ -121,33 +333,69 @@ class ParticleEmitter:
     def isDone(self):
         return self.done
 
-    def draw(self, cr):
+    def draw(self, cr, alpha=1, filter=None):
         if self.done:
             return
         for particle in self.particles:
             if particle.life > 0:
-                particle.draw(cr)
+                particle.draw(cr, alpha, filter)
  
 
-__particlePool__ = ParticlePool(Particles.POOLED_PARTICLES)
-__particleEmitters__ = []
-
-def add_new_emmitter(new_emmiter):
-    global __particleEmitters__
-    if len(__particleEmitters__) < Particles.MAX_EMMITTERS:
-        __particleEmitters__.append(new_emmiter)
-        new_emmiter.init_particles()
-    else:
-        print("Too many emitters!!")
-
-def update(time_delta):
-    global __particleEmitters__
-    for pe in __particleEmitters__[:]:
-        pe.update(time_delta)
-        if pe.isDone():
-            __particleEmitters__.remove(pe)
-
-def draw(cr):
-    global __particleEmitters__
-    for pe in __particleEmitters__:
-        pe.draw(cr)
+class ParticleSystem:
+    def __init__(self, pool_size=Particles.POOLED_PARTICLES, max_emitters=Particles.MAX_EMMITTERS, vectorized=Particles.VECTORIZED, pool_policy=Particles.POOL_POLICY, rng=random, entities=None):
+        if vectorized and numpy == None:
+            print("numpy is not available, using the python particle backend")
+            vectorized = False
+        self.vectorized = vectorized
+        self.pool = VectorParticlePool(pool_size, pool_policy) if vectorized else ParticlePool(pool_size, pool_policy)
+        self.max_emitters = max_emitters
+        self.random = rng
+        self.overflows = 0  #emitters turned away because max_emitters were already running
+        self.quality_scale = 1  #new emitters get this fraction of their particles and emission rate, see QualityLevels
+        self.sprite_filter = None #cairo filter particles are drawn with, None leaves cairo's default
+        self.emitter_pools = ObjectPool.Pools()
+        #emitters can live in the game's EntityStore, the game then compacts them along with everything else
+        self.entities = entities if entities != None else EntityStore.EntityStore()
+        self.compacts = entities == None
+        self.emitters = self.entities.group("emitters", self.emitter_pools.release)
+
+    #Use this instead of creating emitters, e.g. new_emitter(SmokeEmitter, x, y, speed_x, speed_y)
+    def new_emitter(self, kind, *args):
+        return self.emitter_pools.acquire(kind, *args)
+
+    def add_new_emmitter(self, new_emmiter):
+        if self.entities.count("emitters") < self.max_emitters:
+            self.entities.spawn("emitters", new_emmiter)
+            new_emmiter.pool = self.pool
+            new_emmiter.random = self.random
+            if self.quality_scale != 1:
+                new_emmiter.particle_count = max(1, int(new_emmiter.particle_count*self.quality_scale))
+                new_emmiter.rate *= self.quality_scale
+            new_emmiter.init_particles()
+            if self.vectorized:
+                new_emmiter.particle_indices = self.pool.indices_of(new_emmiter.particles)
+        else:
+            self.overflows += 1
+            self.emitter_pools.release(new_emmiter)
+            print("Too many emitters!!")
+
+    def update(self, time_delta):
+        if self.vectorized:
+            self.pool.update(self.emitters, time_delta)
+            for pe in self.emitters:
+                if pe.isDone():
+                    self.entities.despawn(pe)
+        else:
+            for pe in self.emitters:
+                pe.update(time_delta)
+                if pe.isDone():
+                    self.entities.despawn(pe)
+        if self.compacts:
+            self.entities.compact()
+
+    def draw(self, cr, alpha=1):
+        if self.vectorized:
+            self.pool.draw(self.emitters, cr, alpha, self.sprite_filter)
+            return
+        for pe in self.emitters:
+            pe.draw(cr, alpha, self.sprite_filter)
@@ -0,0 +1,112 @@
+import cairo
+import csv
+import math
+import time
+from collections import deque
+
+#Per phase frame timings kept in a ring buffer of the last HISTORY frames
+#Usage: t = profiler.start() ... t = profiler.lap("phase", t) ... profiler.end_frame()
+#When disabled start() returns None and lap() returns straight away
+class FrameProfiler:
+    HISTORY = 600
+    OVERLAY_X = 300
+    OVERLAY_Y = 10
+    OVERLAY_LINE_HEIGHT = 14
+    OVERLAY_WIDTH = 420
+
+    def __init__(self, history=HISTORY):
+        self.enabled = False
+        self.phases = []                    #in the order they were first seen
+        self.frames = deque(maxlen=history) #one {phase: miliseconds} per frame
+        self.current = {}
+        self.frame_count = 0
+        self.quality_level = 0              #what the game runs at, see QualityLevels
+        self.levels = deque(maxlen=history) #quality level of every frame in frames
+        self.events = {}                    #frame -> what happened during it, e.g. a quality change
+
+    def start(self):
+        if not self.enabled:
+            return None
+        return time.perf_counter()
+
+    def lap(self, phase, started):
+        if started == None:
+            return None
+        now = time.perf_counter()
+        if phase not in self.current:
+            if phase not in self.phases:
+                self.phases.append(phase)
+            self.current[phase] = 0
+        self.current[phase] += (now - started) * 1000
+        return now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frames.append(self.current)
+        self.levels.append(self.quality_level)
+        self.current = {}
+        self.frame_count += 1
+
+    #Notes text against the frame being timed, it ends up in the CSV next to that frame's timings
+    def event(self, text):
+        if not self.enabled:
+            return
+        self.events[self.frame_count] = text
+        for frame in [frame for frame in self.events if frame < self.frame_count - len(self.frames)]:
+            del self.events[frame]
+
+    def reset(self):
+        self.frames.clear()
+        self.levels.clear()
+        self.events = {}
+        self.current = {}
+
+    #{phase: (mean, p95, p99)} in miliseconds over the frames in the buffer
+    def statistics(self):
+        stats = {}
+        for phase in self.phases:
+            values = sorted(frame.get(phase, 0) for frame in self.frames)
+            if len(values) == 0:
+                continue
+            stats[phase] = (sum(values) / len(values), percentile(values, 0.95), percentile(values, 0.99))
+        return stats
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["frame"] + self.phases + ["quality level", "event"])
+            first_frame = self.frame_count - len(self.frames)
+            for i, frame in enumerate(self.frames):
+                writer.writerow([first_frame + i] + ["%.4f" % frame.get(phase, 0) for phase in self.phases] + [self.levels[i], self.events.get(first_frame + i, "")])
+
+    def overlay_box(self):
+        return (self.OVERLAY_X, self.OVERLAY_Y, self.OVERLAY_WIDTH, self.OVERLAY_LINE_HEIGHT * (len(self.phases) + 3))
+
+    def draw(self, cr):
+        x, y, w, h = self.overlay_box()
+        cr.save()
+        cr.set_source_rgba(0, 0, 0, 0.6)
+        cr.rectangle(x, y, w, h)
+        cr.fill()
+        cr.set_source_rgb(1, 1, 1)
+        cr.select_font_face("Monospace", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+        cr.set_font_size(11)
+        y += self.OVERLAY_LINE_HEIGHT
+        cr.move_to(x + 5, y)
+        cr.show_text("%-24s %8s %8s %8s" % ("phase (ms)", "mean", "p95", "p99"))
+        stats = self.statistics()
+        for phase in self.phases:
+            y += self.OVERLAY_LINE_HEIGHT
+            mean, p95, p99 = stats.get(phase, (0, 0, 0))
+            cr.move_to(x + 5, y)
+            cr.show_text("%-24s %8.3f %8.3f %8.3f" % (phase[:24], mean, p95, p99))
+        y += self.OVERLAY_LINE_HEIGHT
+        cr.move_to(x + 5, y)
+        cr.show_text("quality level %d" % self.quality_level)
+        cr.restore()
+
+
+def percentile(sorted_values, fraction):
+    index = max(int(math.ceil(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[index]
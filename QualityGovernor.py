@@ -0,0 +1,67 @@
+import cairo
+from collections import deque
+
+from Profiler import percentile
+
+#What every quality level gives up, level 0 is full quality and each one degrades a bit more than the last
+class QualityLevels:
+    PARTICLE_SCALE = (1, 0.5, 0.5, 0.5, 0.25)   #of every new emitter's particle count and emission rate
+    SKID_MARKS = (True, True, False, False, False)
+    SPRITE_FILTER = (None, None, None, cairo.FILTER_FAST, cairo.FILTER_FAST) #None leaves cairo's own (FILTER_GOOD)
+    FAR_TRAFFIC_EVERY = (1, 1, 1, 1, 3)         #npvs beyond the collision horizon only move every this many steps
+    COUNT = 5
+
+
+#Watches how long frames take against a budget and picks the quality level the game should run at
+#The level goes down one step at a time when the slow frames of the last WINDOW go over budget
+#and back up once they fit in HEADROOM of it, HOLD frames have to pass between two changes
+#The level has to reach the Simulation as an Inputs.QUALITY input so recordings replay it
+class QualityGovernor:
+    BUDGET = 1000/60.0  #in miliseconds
+    WINDOW = 30
+    SLOW_FRAMES = 0.9   #percentile of the window compared against the budget
+    HEADROOM = 0.6
+    HOLD = 60
+
+    def __init__(self, budget=BUDGET, window=WINDOW):
+        self.budget = budget
+        self.frame_times = deque(maxlen=window)
+        self.level = 0
+        self.hold = 0
+        self.frames = 0
+        self.frames_at_level = [0]*QualityLevels.COUNT
+        self.transitions = []   #(frame, from level, to level, slow frame time in ms)
+
+    #Feed it how long the last frame took to update and draw, returns the new level when it changes, None otherwise
+    def frame(self, frame_time):
+        self.frames += 1
+        self.frames_at_level[self.level] += 1
+        self.frame_times.append(frame_time)
+        if self.hold > 0:
+            self.hold -= 1
+            return None
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return None
+        slow = percentile(sorted(self.frame_times), self.SLOW_FRAMES)
+        if slow > self.budget and self.level < QualityLevels.COUNT - 1:
+            level = self.level + 1
+        elif slow < self.budget*self.HEADROOM and self.level > 0:
+            level = self.level - 1
+        else:
+            return None
+        self.transitions.append((self.frames, self.level, level, slow))
+        self.level = level
+        self.hold = self.HOLD
+        self.frame_times.clear()
+        return level
+
+    def describe(self, transition):
+        frame, old, new, slow = transition
+        return "Quality level %d -> %d at frame %d (slow frames %.1fms, budget %.1fms)" % (old, new, frame, slow, self.budget)
+
+    def statistics(self):
+        return {"level": self.level,
+                "budget_ms": self.budget,
+                "frames": self.frames,
+                "frames_at_level": list(self.frames_at_level),
+                "transitions": [{"frame": frame, "from": old, "to": new, "slow_frame_ms": slow} for frame, old, new, slow in self.transitions]}
@@ -0,0 +1,106 @@
+#Renders every tick of a recorded game (see Replay.py) to an image, with no window
+#  python RenderRecording.py session.json frames/ [--format png|rgb] [--processes N]
+#rgb frames are raw 8 bit R, G, B rows of Window.WIDTH x Window.HEIGHT pixels
+#The timeline is cut into one segment per process, each worker replays up to its segment start and renders from there
+import cairo
+import multiprocessing
+import os
+import sys
+import time
+
+from Replay import Recording, replay
+from Simulation import Window
+
+FORMATS = ("png", "rgb")
+
+def frame_path(directory, tick, image_format):
+    return os.path.join(directory, "frame_%06d.%s" % (tick, image_format))
+
+def write_rgb(surface, path):
+    #ARGB32 is stored as B, G, R, A bytes on little endian machines, the road makes every frame opaque
+    width = surface.get_width()
+    stride = surface.get_stride()
+    data = bytes(surface.get_data())
+    rgb = bytearray(width * 3 * surface.get_height())
+    for y in range(surface.get_height()):
+        row = data[y*stride : y*stride + width*4]
+        start = y * width * 3
+        rgb[start : start + width*3 : 3] = row[2::4]
+        rgb[start + 1 : start + width*3 : 3] = row[1::4]
+        rgb[start + 2 : start + width*3 : 3] = row[0::4]
+    with open(path, "wb") as rgb_file:
+        rgb_file.write(rgb)
+
+#Runs in a worker: renders ticks [start, end) and returns how many frames did not match the recorded state
+def render_segment(arguments):
+    recording_path, directory, image_format, start, end = arguments
+    recording = Recording.load(recording_path)
+    simulation, mismatch = replay(recording, stop_at=start, check=False)
+    by_tick = recording.inputs_by_tick()
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, Window.WIDTH, Window.HEIGHT)
+    cr = cairo.Context(surface)
+    mismatches = 0
+    for tick in range(start, end):
+        simulation.step(simulation.tick_length, by_tick[tick])
+        if tick < len(recording.hashes) and simulation.state_hash() != recording.hashes[tick]:
+            mismatches += 1
+        simulation.draw(cr)
+        surface.flush()
+        if image_format == "png":
+            surface.write_to_png(frame_path(directory, tick, image_format))
+        else:
+            write_rgb(surface, frame_path(directory, tick, image_format))
+    return mismatches
+
+def segments(ticks, count):
+    bounds = [ticks * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i+1]) for i in range(count) if bounds[i+1] > bounds[i]]
+
+def render(recording_path, directory, image_format="png", processes=None):
+    recording = Recording.load(recording_path)
+    if recording == None:
+        return None
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    processes = processes if processes != None else multiprocessing.cpu_count()
+    jobs = [(recording_path, directory, image_format, start, end) for start, end in segments(recording.ticks, processes)]
+    if len(jobs) <= 1:
+        return sum(render_segment(job) for job in jobs)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return sum(pool.map(render_segment, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+def main(args):
+    image_format = "png"
+    processes = None
+    paths = []
+    i = 0
+    while i < len(args):
+        if args[i] == "--format":
+            image_format = args[i+1]
+            i += 1
+        elif args[i] == "--processes":
+            processes = int(args[i+1])
+            i += 1
+        else:
+            paths.append(args[i])
+        i += 1
+    if len(paths) != 2 or image_format not in FORMATS:
+        print("Usage: python RenderRecording.py session.json frames/ [--format png|rgb] [--processes N]")
+        return 2
+
+    started = time.perf_counter()
+    mismatches = render(paths[0], paths[1], image_format, processes)
+    if mismatches == None:
+        return 2
+    print("Rendered in %.3fs" % (time.perf_counter() - started))
+    if mismatches > 0:
+        print("%d frames did not match the recorded game state!!" % mismatches)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
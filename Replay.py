@@ -0,0 +1,104 @@
+#Recorded games: the seed plus every input against the simulation tick it was applied on
+#  python racer.py --record session.json [--seed N]   records while playing
+#  python Replay.py session.json                       plays it back headless as fast as possible
+#A replay checks its state hash against the recorded one every tick, so recordings double as regression fixtures
+import json
+import sys
+import time
+
+from Simulation import Simulation
+
+class Recording:
+    VERSION = 1
+
+    def __init__(self, seed, num_of_players=1, tick_rate=Simulation.TICK_RATE, max_npvs=Simulation.MAX_NPVS, spawn_delay=Simulation.SPAWN_DELAY, vectorized_particles=False):
+        self.seed = seed
+        self.num_of_players = num_of_players
+        self.tick_rate = tick_rate
+        self.max_npvs = max_npvs
+        self.spawn_delay = spawn_delay
+        self.vectorized_particles = vectorized_particles
+        self.ticks = 0
+        self.inputs = []    #(tick, player_id, action, value)
+        self.hashes = []    #state hash after every tick
+
+    @staticmethod
+    def of(simulation):
+        #Start recording simulation, it has to be a fresh game
+        recording = Recording(simulation.seed, simulation.num_of_players, simulation.tick_rate, simulation.max_npvs, simulation.npv_spawn_delay, simulation.particles.vectorized)
+        simulation.recording = recording
+        return recording
+
+    def record(self, tick, inputs, state_hash):
+        for player_id, action, value in inputs:
+            self.inputs.append((tick, player_id, action, value))
+        self.hashes.append(state_hash)
+        self.ticks = tick + 1
+
+    def create_simulation(self):
+        return Simulation(self.num_of_players, self.tick_rate, self.max_npvs, self.spawn_delay, self.vectorized_particles, self.seed)
+
+    #[inputs of tick 0, inputs of tick 1, ...]
+    def inputs_by_tick(self):
+        by_tick = [[] for i in range(self.ticks)]
+        for tick, player_id, action, value in self.inputs:
+            by_tick[tick].append((player_id, action, value))
+        return by_tick
+
+    def save(self, path):
+        with open(path, "w") as recording_file:
+            json.dump({"version": self.VERSION,
+                       "seed": self.seed,
+                       "players": self.num_of_players,
+                       "tick_rate": self.tick_rate,
+                       "max_npvs": self.max_npvs,
+                       "spawn_delay": self.spawn_delay,
+                       "vectorized_particles": self.vectorized_particles,
+                       "ticks": self.ticks,
+                       "inputs": self.inputs,
+                       "hashes": self.hashes}, recording_file)
+
+    @staticmethod
+    def load(path):
+        with open(path) as recording_file:
+            data = json.load(recording_file)
+        if data["version"] != Recording.VERSION:
+            print("Unsupported recording version " + str(data["version"]) + "!!")
+            return None
+        recording = Recording(data["seed"], data["players"], data["tick_rate"], data["max_npvs"], data["spawn_delay"], data["vectorized_particles"])
+        recording.ticks = data["ticks"]
+        recording.inputs = [tuple(event) for event in data["inputs"]]
+        recording.hashes = data["hashes"]
+        return recording
+
+
+#Steps through the whole recording, stop_at limits it to the first ticks
+#Returns the simulation and the first tick whose state did not match the recording (None if they all did)
+def replay(recording, stop_at=None, check=True):
+    simulation = recording.create_simulation()
+    by_tick = recording.inputs_by_tick()
+    ticks = recording.ticks if stop_at == None else min(stop_at, recording.ticks)
+    for tick in range(ticks):
+        simulation.step(simulation.tick_length, by_tick[tick])
+        if check and tick < len(recording.hashes) and simulation.state_hash() != recording.hashes[tick]:
+            return simulation, tick
+    return simulation, None
+
+def main(args):
+    if len(args) != 1:
+        print("Usage: python Replay.py session.json")
+        return 2
+    recording = Recording.load(args[0])
+    if recording == None:
+        return 2
+    started = time.perf_counter()
+    simulation, mismatch = replay(recording)
+    elapsed = time.perf_counter() - started
+    if mismatch != None:
+        print("Replay diverged from the recording at tick %d!!" % mismatch)
+        return 1
+    print("Replayed %d ticks in %.3fs (%.0f ticks/s), every state hash matched" % (recording.ticks, elapsed, recording.ticks / elapsed if elapsed > 0 else 0))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
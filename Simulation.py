@@ -0,0 +1,1430 @@
+import cairo
+import hashlib
+import random
+import math
+
+import Assets
+from Assets import Image, ImageTuple, Derived
+import EntityStore
+import ObjectPool
+import ParticleManager
+from QualityGovernor import QualityLevels
+import Profiler
+import SpriteCache
+import TextCache
+from SpatialIndex import LaneIndex
+
+# 1 meter = 36 pixels !!
+
+class Window:
+    WIDTH = 1024
+    HEIGHT = 512
+    
+    VERSION = "v2.1"
+
+class HUD:
+    PLAYER2_DELTA_X = 800
+    SCORE_POS_X = (50, 50+PLAYER2_DELTA_X)
+    SCORE_POS_Y = (50, 50)
+    TIME_OUT_POS_X = (50, 50+PLAYER2_DELTA_X)
+    TIME_OUT_POS_Y = (70, 70)
+    INVENTORY_X = (50, 50+PLAYER2_DELTA_X)
+    INVENTORY_Y = (450, 450)
+    POINTS100_X = (50, 50+PLAYER2_DELTA_X)
+    POINTS100_SPEED_DIRECTION = (1, -1)
+    TEXT_BOX_WIDTH = 220 #room for the score and timer text, see PlayerHUD
+    TEXT_BOX_HEIGHT = 30
+    TEXT_ASCENT = 22
+
+class Inputs:
+    #An input is a (player_id, action, value) tuple
+    #value is True/False for held keys and the inventory slot number for USE_POWER_UP
+    BRAKE = 0
+    FORWARD = 1
+    UP = 2
+    DOWN = 3
+    USE_POWER_UP = 4
+    QUALITY = 5 #value is the level from QualityGovernor, player_id is ignored
+
+class RoadPositions:
+    UPPER_LIMIT = 105
+    LOWER_LIMIT = 404
+    FORWARD_LIMIT = 912
+    REAR_LIMIT = 0
+    LEFT_LANE = 165
+    MIDDLE_LANE = 260
+    RIGHT_LANE = 355
+    BEYOND_HORIZON = 1312
+    BEHIND_REAR_HORIZON = -250
+    COLLISION_HORIZON = Window.WIDTH + 100
+    LANE_EDGES = ((LEFT_LANE + MIDDLE_LANE)/2.0, (MIDDLE_LANE + RIGHT_LANE)/2.0) #for the LaneIndexes
+
+class Speed:
+    ONE_METER = 36
+    KMH_TO_MS = 0.2777
+    MS_TO_PMIL =  0.036 #m/s tp pixels per milisecond
+    KMH_TO_PMIL = KMH_TO_MS*MS_TO_PMIL
+    SIXTY_KMH = 60*KMH_TO_PMIL
+    ONE_KMH = KMH_TO_PMIL
+    ONE_RADMIL = 0.001 
+    MAX_KMH = 80
+    MAX_WOBBLE_ROTATION = 0.52359
+    MAX_SPEED = MAX_KMH*ONE_KMH
+    BASE_CRASH_SPEED_DECREASE = (10*ONE_KMH) 
+    REFERENCE_FRAME_TIME = 1000/60.0 #per frame amounts below were tuned for 60fps
+    PLAYER_MOVE = 5/REFERENCE_FRAME_TIME #pixels per milisecond
+    PLAYER_SHRUNK_MOVE = 2/REFERENCE_FRAME_TIME
+    LANE_CHANGE = 5/REFERENCE_FRAME_TIME #at MAX_SPEED
+    SPIN_DECELERATION = ONE_KMH/REFERENCE_FRAME_TIME
+    WOBBLE_ACCELERATION = 0.2*ONE_RADMIL/REFERENCE_FRAME_TIME
+
+def lerp(previous, current, alpha):
+    return previous + (current - previous)*alpha
+
+#Swept collisions: boxes are (x, y, w, h) at the start and at the end of a step, moving in a straight line in between
+#Returns the fraction of the step (0 to 1) at which the two first overlap, None if they never do during the step
+def time_of_impact(previous1, box1, previous2, box2):
+    entry = 0.0
+    leave = 1.0
+    for axis in (0, 1):
+        size = axis + 2
+        start = previous1[axis] - previous2[axis] #1 relative to 2, they overlap while it is between -size1 and size2
+        velocity = (box1[axis] - previous1[axis]) - (box2[axis] - previous2[axis])
+        low = -box1[size]
+        high = box2[size]
+        if velocity == 0:
+            if start <= low or start >= high:
+                return None
+            continue
+        t0 = (low - start)/velocity
+        t1 = (high - start)/velocity
+        if t0 > t1:
+            t0, t1 = t1, t0
+        if t0 > entry:
+            entry = t0
+        if t1 < leave:
+            leave = t1
+        if entry >= leave:
+            return None
+    return entry
+
+#Everything a box touches on its way through a step, grown by reach on every side
+def swept_box(previous, box, reach=0):
+    left = min(previous[0], box[0]) - reach
+    top = min(previous[1], box[1]) - reach
+    right = max(previous[0] + previous[2], box[0] + box[2]) + reach
+    bottom = max(previous[1] + previous[3], box[1] + box[3]) + reach
+    return (left, top, right - left, bottom - top)
+
+class SkidMarks:
+    SKID_LEFT = Image("skid_left.png")
+    SKID_RIGHT= Image("skid_right.png")
+
+
+class CarModels:
+    GALLARDO_PLAYER1 = Image("./gallardo_player1.png")
+    GALLARDO_PLAYER2 = Image("./gallardo_player2.png")
+    CORVETTE = Image("corvette.png")
+    AMBULANCE = Image("emergency.png")
+    CHARGER = Image("./charger.png")
+    GOLF = Image("./golf.png")
+    INTEGRA = Image("./integra.png")
+    SUPRA = Image("./supra.png")
+    F430 = Image("./f430.png")
+    CCX = Image("./ccx.png")
+    COP = Image("./cop.png")
+    DB9 = Image("./db9.png")
+    F1 = Image("./f1.png")
+    SUPERLEGGERA = Image("./gallardo_superleggera.png")
+    GT = Image("./gt.png")
+    LP570 = Image("./lp570.png")
+    MURCIELAGO = Image("./murcielago.png")
+    R8 = Image("./r8.png")
+    RS4 = Image("./rs4.png")
+    SL65 = Image("./sl65.png")
+    SLR = Image("./slr.png")
+    TRUCK_BLUE = Image("./truck_blue.png")
+    TRUCK_RED = Image("./truck_red.png")
+    TRUCK_GREEN = Image("./truck_green.png")
+
+    AVAILABLE_CARS = ImageTuple( CORVETTE, CHARGER, GOLF, INTEGRA, SUPRA, F430, CCX, DB9, F1, SUPERLEGGERA, GT, LP570, MURCIELAGO, R8, RS4, SL65, SLR )
+    TRUCKS = ImageTuple( TRUCK_GREEN, TRUCK_RED, TRUCK_BLUE )
+    EMERGENCY_CARS = ImageTuple( AMBULANCE, COP )
+
+class PowerUps:
+    TIME_OUT = 10000 #in miliseconds
+    INVENTORY_SIZE = 5
+    ICON_SIZE = 32
+    EMPTY = Image("./empty.png")
+    SHIELD = Image("./shield.png")
+    ENERGY_SHIELD = Image("./energyshield.png")
+    ENERGY_SHIELD_WIDTH = Derived(lambda: Assets.width(PowerUps.ENERGY_SHIELD))
+    ENERGY_SHIELD_HEIGHT = Derived(lambda: Assets.height(PowerUps.ENERGY_SHIELD))
+    HYDRAULICS = Image("./Hydraulics.png")
+    CALL_911 = Image("./911.png")
+    SHRINK = Image("./shrink.png")
+    PHASER_FIRE = Image("./phaser_fire.png")
+    PHASER = Image("./phaser.png")
+
+class SmokeEmitter(ParticleManager.ParticleEmitter):
+    def __init__(self, x, y, speed_x, speed_y):
+        super(SmokeEmitter, self).__init__(x, y, speed_x, speed_y, 25, ParticleManager.Particles.SMOKE, 20, 0.1)
+    def set_particles(self):
+        for particle in self.particles:
+            particle.set_properties(self.x, self.y, 500, math.pi/2, self.speed_x + self.random.randrange(-5, 5)*Speed.ONE_KMH, self.speed_y + self.random.randrange(-5, 5)*Speed.ONE_KMH,  self.size, self.shape, False)
+
+class PointsEmitter(ParticleManager.ParticleEmitter):
+    def __init__(self, x, y, speed_x, speed_y, size=100, shape=None, rate=0.1, num_of_particles=3):
+        shape = shape if shape != None else ParticleManager.Particles.POINTS
+        super(PointsEmitter, self).__init__(x, y, speed_x, speed_y, size, shape, num_of_particles , 0.1)
+    def set_particles(self):
+        for particle in self.particles:
+            particle.set_properties(self.x, self.y, 700, 0, self.speed_x + self.random.randrange(-5, 5)*Speed.ONE_KMH, self.speed_y + self.random.randrange(-5, 5)*Speed.ONE_KMH,  self.size, self.shape, True)
+
+class Minus10Points(PointsEmitter):
+    def __init__(self, x, y, speed_x, speed_y, size=100, shape=None, num_of_particles=6):
+        super(Minus10Points, self).__init__(x, y, speed_x, speed_y, size, shape, 0.01, num_of_particles)
+    def set_particles(self):
+        for particle in self.particles:
+            particle.set_properties(self.x, self.y, 800, 0, self.speed_x + self.random.randrange(-5, 5)*Speed.ONE_KMH, self.speed_y + self.random.randrange(-5, 5)*Speed.ONE_KMH,  self.size, self.shape, True)
+
+
+class Plus100Points(PointsEmitter):
+    def __init__(self, x, speed):
+        super(Plus100Points, self).__init__(x, 130, speed, 0.1, 200, ParticleManager.Particles.PLUS_100_POINTS, 1, 1)
+
+class Minus100Points(PointsEmitter):
+    def __init__(self, x, speed):
+        super(Minus100Points, self).__init__(x, 130, speed,  0.1, 400, ParticleManager.Particles.MINUS_100_POINTS, 1, 1)
+
+class MessageEmitter(ParticleManager.ParticleEmitter):
+    def __init__(self, x, y, shape):
+        super(MessageEmitter, self).__init__(x, y, 0, 0, 100, shape, 1, 1)
+    def set_particles(self):
+        for particle in self.particles:
+            particle.set_properties(self.x, self.y, 1500, 0, self.speed_x, self.speed_y,  self.size, self.shape, True)
+
+class HolyShit(MessageEmitter):
+    def __init__(self):
+        super(HolyShit, self).__init__(512, 340, ParticleManager.Particles.HOLY_SHIT)
+
+class Mayhem(MessageEmitter):
+    def __init__(self):
+        super(Mayhem, self).__init__(512, 256, ParticleManager.Particles.MAYHEM)
+
+class Annihilation(MessageEmitter):
+    def __init__(self):
+        super(Annihilation, self).__init__(512, 170, ParticleManager.Particles.ANNIHILATION)
+
+class Road():
+    IMAGE = "road3.png"
+    Assets.registry.register(IMAGE)
+    TILE_OFFSET = 128       #road3.png repeats every 512 pixels, a window wide tile starting here lines up with it
+    image = None            #decoded once and shared by every Road
+    tiles = {}              #window sized copies of the image, one per kind of target surface
+
+    def __init__(self, x=0):
+        if Road.image == None:
+            Road.image = Assets.registry.get(self.IMAGE)
+        self.road = Road.image
+        self.x = x; #x is the position on the screen
+        self.width = 2048 #cairo.ImageSurface.get_width(self.road)
+        self.height = cairo.ImageSurface.get_height(self.road)
+        self.previous_x = x
+
+    def save_state(self):
+        self.previous_x = self.x
+
+    def draw_x(self, alpha):
+        return self.x if self.x > self.previous_x else lerp(self.previous_x, self.x, alpha) #dont interpolate across the wrap around
+
+    #The tile is created similar to the surface we draw on so painting it needs no format conversion
+    def tile_for(self, target):
+        tile = Road.tiles.get(type(target))
+        if tile == None:
+            tile = target.create_similar(cairo.CONTENT_COLOR, Window.WIDTH, self.height) #the road is opaque
+            tile_cr = cairo.Context(tile)
+            tile_cr.set_source_surface(self.road, -self.TILE_OFFSET, 0)
+            tile_cr.paint()
+            Road.tiles[type(target)] = tile
+        return tile
+
+    def draw(self, cr, alpha=1):
+        x = self.draw_x(alpha)
+        pattern = cairo.SurfacePattern(self.tile_for(cr.get_target()))
+        pattern.set_extend(cairo.EXTEND_REPEAT)
+        pattern.set_matrix(cairo.Matrix(x0=-x))
+        cr.save()
+        cr.set_source(pattern)
+        cr.rectangle(0, 0, Window.WIDTH, self.height)
+        cr.fill()
+        cr.restore()
+
+    def advance(self, amount):
+        if self.x <= -int(self.width / 2):
+            self.x = 0
+        else:
+            self.x -= amount
+
+#Marks left on the road (skid marks) are stamped once into a surface that scrolls with it, drawing all of them is one blit
+#The surface is a ring of road columns WIDTH + 2*MARGIN wide, column c holds every road x with x % width == c,
+#and the columns that scroll out behind the screen are cleared for the road coming in ahead of it
+#Marks stay on the road until they scroll out, whatever happens to whoever left them
+class Decals:
+    MARGIN = 256    #marks may be stamped this far off either side of the screen
+
+    def __init__(self):
+        self.width = Window.WIDTH + 2*self.MARGIN
+        self.height = Window.HEIGHT
+        self.surface = None             #created similar to what we draw on, on the first draw
+        self.distance = 0               #how far the road has scrolled, the road x of a screen x is x + distance
+        self.previous_distance = 0
+        self.cleared = -self.MARGIN     #road x the ring starts at, the columns before it have been cleared
+        self.pending = []               #stamps not painted into the ring yet, as (image, road x, y)
+        self.ahead = []                 #stamps beyond the ring, they move to pending once they scroll into it
+        self.stamps = []                #(road x of the right edge, top, bottom) of the marks still in the ring
+
+    def save_state(self):
+        self.previous_distance = self.distance
+
+    def advance(self, amount):
+        self.distance += amount
+        if len(self.stamps) > 0:
+            behind = self.distance - self.MARGIN
+            self.stamps = [stamp for stamp in self.stamps if stamp[0] > behind]
+            self.pending = [stamp for stamp in self.pending if stamp[1] + Assets.width(stamp[0]) > behind]
+        if len(self.ahead) > 0:
+            end = self.ring_end()
+            self.pending.extend(stamp for stamp in self.ahead if stamp[1] + Assets.width(stamp[0]) <= end)
+            self.ahead = [stamp for stamp in self.ahead if stamp[1] + Assets.width(stamp[0]) > end]
+
+    #Road x where the ring ends, see update_surface
+    def ring_end(self):
+        return int(math.floor(self.distance)) - self.MARGIN + self.width
+
+    #x and y are where the image's top left corner is on the screen as of the current state
+    def stamp(self, image, x, y):
+        road_x = x + self.distance
+        if x + Assets.width(image) <= -self.MARGIN:
+            return
+        if road_x + Assets.width(image) > self.ring_end():
+            self.ahead.append((image, road_x, y))
+        else:
+            self.pending.append((image, road_x, y))
+        self.stamps.append((road_x + Assets.width(image), y, y + Assets.height(image)))
+
+    def draw_distance(self, alpha):
+        return lerp(self.previous_distance, self.distance, alpha)
+
+    #The ring columns covering road x from start to end, as (column, road x, width) pieces
+    def columns(self, start, end):
+        while start < end:
+            column = start % self.width
+            length = min(end - start, self.width - column)
+            yield column, start, length
+            start += length
+
+    #Clears what scrolled out and paints the pending stamps in
+    def update_surface(self, target):
+        if self.surface == None or type(target) != type(self.surface):
+            surface = target.create_similar(cairo.CONTENT_COLOR_ALPHA, self.width, self.height)
+            if self.surface != None: #the marks already stamped come along
+                copy_cr = cairo.Context(surface)
+                copy_cr.set_source_surface(self.surface, 0, 0)
+                copy_cr.paint()
+            self.surface = surface
+        start = int(math.floor(self.distance)) - self.MARGIN #whole columns so nothing is left half cleared
+        if start <= self.cleared and len(self.pending) == 0:
+            return
+        cr = cairo.Context(self.surface)
+        if start > self.cleared:
+            cr.set_operator(cairo.OPERATOR_CLEAR)
+            for column, road_x, length in self.columns(self.cleared, min(start, self.cleared + self.width)):
+                cr.rectangle(column, 0, length, self.height)
+            cr.fill()
+            cr.set_operator(cairo.OPERATOR_OVER)
+            self.cleared = start
+        for image, road_x, y in self.pending:
+            #only the part of the mark still in the ring, the rest would wrap around onto the road ahead
+            for column, piece_x, length in self.columns(max(road_x, start), min(road_x + Assets.width(image), start + self.width)):
+                cr.save()
+                cr.rectangle(column, y, length, Assets.height(image))
+                cr.clip()
+                cr.set_source_surface(image, column - (piece_x - road_x), y)
+                cr.paint()
+                cr.restore()
+        self.pending = []
+        self.surface.flush()
+
+    def draw(self, cr, alpha=1):
+        if len(self.stamps) == 0:
+            return
+        self.update_surface(cr.get_target())
+        top = min(stamp[1] for stamp in self.stamps)
+        bottom = max(stamp[2] for stamp in self.stamps)
+        pattern = cairo.SurfacePattern(self.surface)
+        pattern.set_extend(cairo.EXTEND_REPEAT)
+        pattern.set_matrix(cairo.Matrix(x0=self.draw_distance(alpha) % self.width))
+        cr.save()
+        cr.set_source(pattern)
+        cr.rectangle(0, top, Window.WIDTH, bottom - top)
+        cr.fill()
+        cr.restore()
+
+class Car:
+    __slots__ = ("model", "vertical_position", "horizontal_position", "height", "width", "height_offset", "speed", "rotation",
+                 "previous_horizontal_position", "previous_vertical_position", "previous_rotation")
+
+    def __init__(self, model, x, y, speed):
+        self.model = model
+        self.vertical_position = y
+        self.horizontal_position = x
+        self.height = Assets.height(model)
+        self.width = Assets.width(model)
+        self.height_offset = self.height/2
+        self.speed = speed
+        self.rotation = 0
+        Car.save_state(self) #subclasses have not set their own state yet
+
+    #NPVs are pooled by the Simulation, a reused one takes its constructor's arguments again
+    def reset(self, *args):
+        self.__init__(*args)
+
+    #Not Here but you must implement an update and a draw method
+
+    #Called before every simulation step so draws can interpolate between the last two states
+    def save_state(self):
+        self.previous_horizontal_position = self.horizontal_position
+        self.previous_vertical_position = self.vertical_position
+        self.previous_rotation = self.rotation
+
+    def check_collision(self, box_x, box_y, box_w, box_h, car):
+            if ((box_x < car.horizontal_position + car.width) #if box is before end of car
+                    and (box_x + box_w > car.horizontal_position) #if front of box is ahead of car back
+                    and (box_y < car.vertical_position + car.height) #if box is below passanger side of car
+                    and (box_y + box_h > car.vertical_position)): #if box overlaps car by the side
+                return True
+            else:
+                return False
+
+    AHEAD_DISTANCE = 250 #Distance to check for vehicles ahead
+
+    def ahead(self, other):
+        box_x = other.horizontal_position + other.width
+        box_y = other.vertical_position
+        box_h = other.height
+        box_w = self.AHEAD_DISTANCE
+        return self.check_collision(box_x, box_y, box_w, box_h, self)
+
+    def bounds(self):
+        return (self.horizontal_position, self.vertical_position, self.width, self.height)
+
+    #Where bounds() was when the step started
+    def previous_bounds(self):
+        return (self.previous_horizontal_position, self.previous_vertical_position, self.width, self.height)
+
+    #t is a fraction of the last step, as returned by time_of_impact
+    def position_at(self, t):
+        return (lerp(self.previous_horizontal_position, self.horizontal_position, t), lerp(self.previous_vertical_position, self.vertical_position, t))
+
+    def slower(self, other):
+        return (self.speed < other.speed)
+
+
+class Player(Car):
+    __slots__ = ("player_id", "game", "draw_rotation", "up", "down", "forward", "braking", "crash_handler", "score", "score_hundreds",
+                 "inventory", "powerUpTimeOut", "hydraulics", "shield", "shrunk", "fire_phaser", "phaser_alpha", "phaser_gaining_intensity", "hud")
+
+    def __init__(self, model, x, y, speed, player_id, game):
+        super(Player, self).__init__(model, x, y, speed)
+        self.player_id = player_id
+        self.game = game
+        self.draw_rotation = False
+        self.up = False
+        self.down = False
+        self.forward = False
+        self.braking = False
+        self.crash_handler = None
+        self.score = 0
+        self.score_hundreds = 0
+
+        self.inventory = []
+        self.powerUpTimeOut = 0
+        self.hydraulics = False
+        self.shield = False
+        self.shrunk = False
+        self.fire_phaser = False
+        self.phaser_alpha = 0
+        self.phaser_gaining_intensity = True
+        self.hud = PlayerHUD(self)
+
+    def update(self, time_delta):
+        for i in range(self.score_hundreds - int(self.score / 100)):
+            self.game.particles.add_new_emmitter(self.game.particles.new_emitter(Minus100Points, HUD.POINTS100_X[self.player_id], HUD.POINTS100_SPEED_DIRECTION[self.player_id]*Speed.MAX_SPEED))
+        self.score += 0.01 * time_delta
+        old_score_hundreds = self.score_hundreds
+        self.score_hundreds = int(self.score / 100)
+        for i in range(self.score_hundreds-old_score_hundreds):
+            self.game.particles.add_new_emmitter(self.game.particles.new_emitter(Plus100Points, HUD.POINTS100_X[self.player_id], HUD.POINTS100_SPEED_DIRECTION[self.player_id]*Speed.MAX_SPEED))
+        #Adjust postition to user input
+        movement = time_delta*(Speed.PLAYER_MOVE if not self.shrunk else Speed.PLAYER_SHRUNK_MOVE)
+        if self.up and self.vertical_position > RoadPositions.UPPER_LIMIT + self.height_offset:
+            self.vertical_position -= movement
+        elif self.down and self.vertical_position < RoadPositions.LOWER_LIMIT - self.height_offset:
+            self.vertical_position += movement
+        
+        if self.forward and self.horizontal_position < RoadPositions.FORWARD_LIMIT:
+            self.horizontal_position += movement
+        elif self.braking and self.horizontal_position > RoadPositions.REAR_LIMIT:
+            self.horizontal_position -= movement
+
+        if self.speed < Speed.MAX_SPEED:
+            displacement = (Speed.MAX_SPEED - self.speed)*time_delta
+            self.horizontal_position -= displacement if (self.horizontal_position - displacement) >= 0 else 0 
+
+        if self.fire_phaser:
+            if self.phaser_gaining_intensity:
+                self.phaser_alpha += time_delta*0.005
+                if self.phaser_alpha >= 1:
+                    self.phaser_alpha = 1
+                    self.phaser_gaining_intensity = False
+            else:
+                self.phaser_alpha -= time_delta*0.005
+                if self.phaser_alpha <= 0:
+                    self.phaser_alpha = 0
+                    self.phaser_gaining_intensity = True
+                    self.fire_phaser = False
+
+        if(self.powerUpTimeOut > 0):
+            self.powerUpTimeOut -= time_delta
+        if self.powerUpTimeOut <= 0:
+            self.disablePowerUps()
+            self.powerUpTimeOut = 0
+
+    def draw_transform(self, alpha):
+        x = lerp(self.previous_horizontal_position, self.horizontal_position, alpha)
+        y = lerp(self.previous_vertical_position, self.vertical_position, alpha) - self.height_offset
+        rotation = lerp(self.previous_rotation, self.rotation, alpha) if self.draw_rotation else 0
+        scale_x = 1.2 if self.hydraulics else 1
+        scale_y = (1.2 if self.hydraulics else 1) * (0.5 if self.shrunk else 1)
+        return x, y, rotation, scale_x, scale_y
+
+    def draw(self, cr, alpha=1, sprite_filter=None):
+        x, y, rotation, scale_x, scale_y = self.draw_transform(alpha)
+        if self.fire_phaser:
+            cr.set_source_surface(PowerUps.PHASER_FIRE, x + 10, y + self.height_offset - 8)
+            cr.paint_with_alpha(self.phaser_alpha)
+        SpriteCache.draw(cr, self.model, x, y, rotation, scale_x, scale_y, 1, sprite_filter)
+        if self.shield: #follows the car's transform, the shield is drawn live
+            cr.save()
+            cr.translate(x, y)
+            SpriteCache.default_cache.transform(cr, self.model, rotation, scale_x, scale_y)
+            cr.translate(self.width/2 - PowerUps.ENERGY_SHIELD_WIDTH/2, self.height_offset - PowerUps.ENERGY_SHIELD_HEIGHT/2)
+            cr.set_source_surface(PowerUps.ENERGY_SHIELD, 0, 0)
+            cr.paint()
+            cr.restore()
+       
+        self.hud.draw(cr)
+
+    def draw_score(self, cr):
+        colour = (1, 1, 1) if self.score > 0 else (1, 0, 0)
+        TextCache.draw(cr, "SCORE: " + str(int(self.score)), HUD.SCORE_POS_X[self.player_id], HUD.SCORE_POS_Y[self.player_id], "Sans", 20, colour)
+
+    def draw_power_up_timer(self, cr):
+        if self.powerUpTimeOut <= 0:
+            return
+        time_out_seconds = int(self.powerUpTimeOut / 1000)
+        colour = (1, 1, 1) if time_out_seconds > 3 else (1, 0, 0)
+        TextCache.draw(cr, "0:" + str(time_out_seconds), HUD.TIME_OUT_POS_X[self.player_id], HUD.TIME_OUT_POS_Y[self.player_id], "Sans", 20, colour)
+
+    def draw_inventory(self, cr):
+        for i in range(PowerUps.INVENTORY_SIZE):
+            cr.save()
+            x = HUD.INVENTORY_X[self.player_id]+PowerUps.ICON_SIZE*i
+            cr.translate(x, HUD.INVENTORY_Y[self.player_id])
+            if i < len(self.inventory):
+                cr.set_source_surface(self.inventory[i].icon, 0, 0)
+            else:
+                cr.set_source_surface(PowerUps.EMPTY, 0, 0)
+
+            if self.powerUpTimeOut > 0:
+                cr.paint_with_alpha(0.5)
+            else:
+                cr.paint()
+
+            cr.restore()
+
+            colour = (1, 1, 1) if self.powerUpTimeOut == 0 else (1, 0, 0)
+            TextCache.draw(cr, str(i+1), x + (PowerUps.ICON_SIZE/2)-7, HUD.INVENTORY_Y[self.player_id]+PowerUps.ICON_SIZE+20, "Sans", 14, colour)
+
+    def addPowerUp(self, powerup):
+        if len(self.inventory) < PowerUps.INVENTORY_SIZE:
+            self.inventory.append(powerup)
+            return True
+        return False
+
+    def usePowerUp(self, num):
+        if(num <= len(self.inventory) and self.powerUpTimeOut == 0):
+            powerup = self.inventory.pop(num-1)
+            powerup.execute()
+            self.game.pools.release(powerup)
+            self.game.power_ups_used += 1
+
+    def disablePowerUps(self):
+        self.hydraulics = False
+        self.shield = False
+        self.shrunk = False
+        self.height = Assets.height(self.model)
+        self.height_offset = self.height/2
+
+#The score, timer and inventory of a player, composed into two surfaces that are only redrawn when what they show changes
+class PlayerHUD:
+    def __init__(self, player):
+        self.player = player
+        self.surfaces = None
+        self.target_type = None
+        self.status_key = None
+        self.inventory_key = None
+        self.compositions = 0
+
+    def status_box(self):
+        player_id = self.player.player_id
+        return (HUD.SCORE_POS_X[player_id], HUD.SCORE_POS_Y[player_id] - HUD.TEXT_ASCENT, HUD.TEXT_BOX_WIDTH, HUD.TIME_OUT_POS_Y[player_id] - HUD.SCORE_POS_Y[player_id] + HUD.TEXT_BOX_HEIGHT)
+
+    def inventory_box(self):
+        player_id = self.player.player_id
+        return (HUD.INVENTORY_X[player_id], HUD.INVENTORY_Y[player_id], PowerUps.ICON_SIZE*PowerUps.INVENTORY_SIZE, PowerUps.ICON_SIZE + HUD.TEXT_BOX_HEIGHT)
+
+    #Everything the surfaces depend on, they are composed again as soon as it changes
+    def keys(self):
+        player = self.player
+        timer = int(player.powerUpTimeOut / 1000) if player.powerUpTimeOut > 0 else None
+        status = (int(player.score), player.score > 0, timer)
+        inventory = (tuple(powerup.icon for powerup in player.inventory), player.powerUpTimeOut > 0, player.powerUpTimeOut == 0)
+        return status, inventory
+
+    def compose(self, surface, box, draw):
+        cr = cairo.Context(surface)
+        cr.set_operator(cairo.OPERATOR_CLEAR)
+        cr.paint()
+        cr.set_operator(cairo.OPERATOR_OVER)
+        cr.translate(-box[0], -box[1])
+        draw(cr)
+        self.compositions += 1
+
+    def draw(self, cr):
+        target = cr.get_target()
+        if self.surfaces == None or type(target) != self.target_type:
+            #similar to what we draw on so blitting needs no format conversion
+            self.surfaces = [target.create_similar(cairo.CONTENT_COLOR_ALPHA, box[2], box[3]) for box in (self.status_box(), self.inventory_box())]
+            self.target_type = type(target)
+            self.status_key = None
+            self.inventory_key = None
+        status_key, inventory_key = self.keys()
+        if status_key != self.status_key:
+            self.compose(self.surfaces[0], self.status_box(), self.draw_status)
+            self.status_key = status_key
+        if inventory_key != self.inventory_key:
+            self.compose(self.surfaces[1], self.inventory_box(), self.player.draw_inventory)
+            self.inventory_key = inventory_key
+        for surface, box in zip(self.surfaces, (self.status_box(), self.inventory_box())):
+            cr.set_source_surface(surface, box[0], box[1])
+            cr.paint()
+
+    def draw_status(self, cr):
+        self.player.draw_score(cr)
+        self.player.draw_power_up_timer(cr)
+
+
+class NPV(Car): #NPV - Non Player Vehicle
+    __slots__ = ("random", "angular_speed", "wobbling", "wobbling_side", "original_lane", "switching_to_left_lane", "switching_to_right_lane",
+                 "skiding", "skid_mark", "skid_stamped", "crashed")
+
+    def __init__(self, model, y, speed, rng=random):
+        super(NPV, self).__init__(model, RoadPositions.BEYOND_HORIZON, y, speed)
+        self.random = rng           #the game's random.Random, so seeded games play out the same
+        self.angular_speed = 0      #NPV specific
+        self.wobbling = False       #NPV specific
+        self.wobbling_side = True #True = Left False=Right #NPV specific
+        self.original_lane = self.vertical_position #NPV specific
+        self.switching_to_left_lane = False   #NPV specific
+        self.switching_to_right_lane = False  #NPV specific
+        self.skiding = False                  #NPV specific
+        self.skid_mark = None                 #NPV specific
+        self.skid_stamped = False             #the skid mark is in the Decals, which keep it from then on
+        self.crashed = False
+
+    #The nearest car in front of us in our lane, within AHEAD_DISTANCE, that we are catching up with, None if there is none
+    #cars is a LaneIndex of the NPVs, nothing changes until overtake() is called
+    def slower_car_ahead(self, cars):
+        if self.skiding or (self.switching_to_left_lane or self.switching_to_right_lane):
+            return None
+        end = self.horizontal_position + self.width + self.AHEAD_DISTANCE
+        for car in cars.ahead(self.vertical_position, self.horizontal_position, end, self):
+            if car.ahead(self) and car.slower(self):
+                return car
+        return None
+
+    def overtake(self, car, cars):
+        if not self.change_lane(cars):
+            self.match_speed_of(car)
+
+    def change_lane(self, cars):
+        self.original_lane = self.vertical_position
+        if self.vertical_position == RoadPositions.LEFT_LANE and self.is_lane_free(cars, RoadPositions.MIDDLE_LANE):
+            self.switching_to_right_lane = True
+        elif self.vertical_position == RoadPositions.RIGHT_LANE and self.is_lane_free(cars, RoadPositions.MIDDLE_LANE):
+            self.switching_to_left_lane = True
+        elif self.vertical_position == RoadPositions.MIDDLE_LANE:        
+            if self.random.randrange(2) == 0 and self.is_lane_free(cars, RoadPositions.LEFT_LANE):
+                self.switching_to_left_lane = True
+            elif self.is_lane_free(cars, RoadPositions.RIGHT_LANE):
+                self.switching_to_right_lane = True
+        if not (self.switching_to_left_lane or self.switching_to_right_lane):
+            return False
+        return True
+
+    def is_lane_free(self, cars, lane):
+        if len(cars) == 0:
+            return True
+        box_x = self.horizontal_position - 20; #begining of the car minus some clearance
+        box_y = lane;   #Middle of the car
+        box_w = self.width + 100 #give it some clearance
+        box_h = self.height
+        for car in cars.query(box_x, box_y, box_w, box_h):
+            if car == self:
+                continue
+            if self.check_collision(box_x, box_y, box_w, box_h, car):
+                return False
+        return True
+
+    def swerve(self):
+        self.change_lane([]) #passing an empty list of other cars: doesnt check if lanes are free
+
+    def match_speed_of(self, other_car):
+        if self.speed < 0: #ignore if we are an ambulance
+            return
+        if other_car.speed > 0:
+            if (other_car.horizontal_position - self.horizontal_position) < self.width+50:
+                self.speed = other_car.speed
+        else:
+            self.speed = 0
+            self.skiding = True
+
+    def hit_from_behind(self):
+        if self.speed > 0:
+            self.speed = (Speed.MAX_KMH - 5)*Speed.ONE_KMH
+        elif self.speed == 0:
+            self.speed = Speed.SIXTY_KMH
+        elif self.speed < 0: #ambulances
+            self.speed += 10*Speed.ONE_KMH
+            
+        if self.random.randrange(2) == 0:
+            self.angular_speed += (0.5*Speed.ONE_RADMIL)
+        else:
+            self.angular_speed -= (0.3*Speed.ONE_RADMIL)
+        self.skiding = True
+        self.swerve()
+
+    def wobble(self):
+        self.wobbling = True
+        self.wobbling_side = (self.random.randrange(2) == 0)
+        self.skiding = True
+        self.swerve()
+
+    def draw(self, cr, alpha=1, sprite_filter=None):
+        SpriteCache.draw(cr, self.model, lerp(self.previous_horizontal_position, self.horizontal_position, alpha), lerp(self.previous_vertical_position, self.vertical_position, alpha) - self.height_offset, lerp(self.previous_rotation, self.rotation, alpha), 1, 1, 1, sprite_filter)
+    
+    def update(self, time_delta, player_speed):
+        horizontal_position_delta = time_delta*(self.speed-player_speed)
+        self.horizontal_position += horizontal_position_delta 
+        self.rotation += time_delta*self.angular_speed
+        if self.rotation != 0:
+            self.speed -= time_delta*Speed.SPIN_DECELERATION if self.speed > 3*Speed.ONE_KMH else 0
+        
+        if self.wobbling:
+            if self.rotation >= Speed.MAX_WOBBLE_ROTATION or self.rotation <= -Speed.MAX_WOBBLE_ROTATION:
+                self.wobbling_side = not self.wobbling_side
+                self.angular_speed = 0
+            if self.wobbling_side == True:
+                self.angular_speed += time_delta*Speed.WOBBLE_ACCELERATION
+            else:
+                self.angular_speed -= time_delta*Speed.WOBBLE_ACCELERATION
+
+        lateral_speed = time_delta*Speed.LANE_CHANGE*(float(self.speed)/float(Speed.MAX_KMH*Speed.ONE_KMH))
+        if self.switching_to_left_lane:
+            if self.original_lane == RoadPositions.RIGHT_LANE:
+                if self.vertical_position <= RoadPositions.MIDDLE_LANE:
+                    self.switching_to_left_lane = False
+                    self.vertical_position = RoadPositions.MIDDLE_LANE
+                else:
+                    self.vertical_position -= lateral_speed
+            else:
+                if self.vertical_position <= RoadPositions.LEFT_LANE:
+                    self.switching_to_left_lane = False
+                    self.vertical_position = RoadPositions.LEFT_LANE
+                else:
+                    self.vertical_position -= lateral_speed
+        elif self.switching_to_right_lane:
+            if self.original_lane == RoadPositions.LEFT_LANE:
+                if self.vertical_position >= RoadPositions.MIDDLE_LANE:
+                    self.switching_to_right_lane = False
+                    self.vertical_position = RoadPositions.MIDDLE_LANE
+                else:
+                    self.vertical_position += lateral_speed
+            else:
+                if self.vertical_position >= RoadPositions.RIGHT_LANE:
+                    self.switching_to_right_lane = False
+                    self.vertical_position = RoadPositions.RIGHT_LANE
+                else:
+                    self.vertical_position += lateral_speed
+        #the mark is stamped into the Decals where we are now, see Simulation.stamp_skid_marks
+        if self.skiding:
+            if self.skid_mark == None and self.switching_to_left_lane:
+                self.skid_mark = SkidMarks.SKID_LEFT
+            elif self.skid_mark == None and self.switching_to_right_lane:
+                self.skid_mark = SkidMarks.SKID_RIGHT
+
+
+class Truck(NPV):
+    __slots__ = ("game", "looted")
+
+    def __init__(self, model, y, speed, game):
+            super(Truck, self).__init__(model, y, speed, game.random)
+            self.game = game
+            self.looted = False
+
+    #Called by the Simulation every step the truck moves, before it does, time_delta is how long it moves for
+    def roll_for_drops(self, time_delta):
+        if(self.horizontal_position < RoadPositions.FORWARD_LIMIT and self.random.random() < self.game.truck_drop_rate*time_delta/1000):
+            self.dropPowerUp()
+        if self.crashed and not self.looted:
+            self.dropPowerUp()
+            self.dropPowerUp()
+            self.looted = True
+
+    def dropPowerUp(self):
+        rand = self.random.randrange(5)
+        if rand == 0:
+            self.game.pools.acquire(Call911, self.game).drop(self.horizontal_position, self.vertical_position-self.height_offset)
+        elif rand == 1:
+            self.game.pools.acquire(Hydraulics, self.game).drop(self.horizontal_position, self.vertical_position-self.height_offset)
+        elif rand == 2:
+            self.game.pools.acquire(Shrink, self.game).drop(self.horizontal_position, self.vertical_position-self.height_offset)
+        elif rand == 3:
+            self.game.pools.acquire(Phaser, self.game).drop(self.horizontal_position, self.vertical_position-self.height_offset)
+        else:
+            self.game.pools.acquire(Shield, self.game).drop(self.horizontal_position, self.vertical_position-self.height_offset)
+
+class PlayerCrashHandler:
+    ACCELARATION = 0.000005/Speed.REFERENCE_FRAME_TIME #per milisecond, for every milisecond since the crash
+    def __init__(self, player, other_object_speed, other_object_mass = 10):
+        self.t = 0
+        self.player = player
+        self.player.game.player_crashes += 1
+        self.player.speed -= self.calculateSpeedDecrease(self.player.speed - other_object_speed, other_object_mass)
+        self.player.forward = False
+        jolt = self.calculateSideJolt(self.player.speed - other_object_speed, other_object_mass)
+        self.player.vertical_position += jolt
+        self.player.draw_rotation = True
+        self.skid_mark = SkidMarks.SKID_LEFT if jolt < 0 else SkidMarks.SKID_RIGHT
+        self.skid_position = None #where the mark was stamped into the Decals, on the first update
+        self.timeout = 1700
+
+    def calculateSpeedDecrease(self, impact_speed, mass):
+        if(impact_speed < 0.1):
+            speedDecrease = Speed.BASE_CRASH_SPEED_DECREASE
+        else:
+            speedDecrease = Speed.BASE_CRASH_SPEED_DECREASE * impact_speed*mass
+        if self.player.speed - speedDecrease <= 0:
+            return self.player.speed
+        else:
+            return speedDecrease
+
+    def calculateSideJolt(self, impact_speed, mass):
+        #jolt = 20**(1+(impact_speed*mass*100)) #TODO Make me better
+        jolt = 20
+        if (self.player.game.random.randrange(2) == 0):
+            if self.player.vertical_position > RoadPositions.UPPER_LIMIT+jolt+self.player.height_offset: 
+                return -jolt 
+            else:
+                return RoadPositions.UPPER_LIMIT + self.player.height_offset - self.player.vertical_position
+        else:
+            if self.player.vertical_position < RoadPositions.LOWER_LIMIT-jolt-self.player.height_offset:
+                return jolt
+            else:
+                return RoadPositions.LOWER_LIMIT - self.player.height_offset - self.player.vertical_position
+
+    def update(self, time_delta):
+        if(self.player.speed >= Speed.MAX_KMH*Speed.ONE_KMH):
+            self.player.speed = Speed.MAX_KMH*Speed.ONE_KMH
+            self.player.rotation = 0.0000001
+            self.player.draw_rotation = False
+
+        if self.player.speed < Speed.MAX_KMH*Speed.ONE_KMH:
+            self.player.speed += self.t*self.ACCELARATION*time_delta
+        if self.player.draw_rotation:
+            self.player.rotation = 2*math.sqrt(self.t+1)**(-1)*math.sin(0.05*self.t)
+
+
+        if self.skid_position == None:
+            self.skid_position = (self.player.horizontal_position, self.player.vertical_position - self.player.height_offset)
+            self.player.game.decals.stamp(self.skid_mark, *self.skid_position)
+
+        self.t += time_delta
+        if self.t >= self.timeout and self.player.draw_rotation == False:
+            self.player.crash_handler = None
+            self.player.game.entities.despawn(self)
+
+class PowerUp:
+    __slots__ = ("player", "game", "icon", "x", "y", "previous_x")
+
+    def __init__(self, game, player=None):
+        self.player = player
+        self.game = game    
+        self.icon = PowerUps.EMPTY
+        self.x = 0
+        self.y = 0
+        self.previous_x = 0
+
+    #PowerUps are pooled by the Simulation, a reused one takes its constructor's arguments again
+    def reset(self, *args):
+        self.__init__(*args)
+
+    def drop(self, x, y):
+        self.game.entities.spawn("items", self)
+        self.x = x
+        self.y = y
+        self.previous_x = x
+        self.game.item_index.insert(self)
+
+    def bounds(self):
+        return (self.x, self.y, PowerUps.ICON_SIZE, PowerUps.ICON_SIZE)
+
+    def previous_bounds(self):
+        return (self.previous_x, self.y, PowerUps.ICON_SIZE, PowerUps.ICON_SIZE)
+
+    def save_state(self):
+        self.previous_x = self.x
+
+    def execute(self):
+        if self.player == None:
+            return
+        self.player.powerUpTimeOut = PowerUps.TIME_OUT
+        self.applyPowerUp()
+    
+    #abstract
+    def applyPowerUp(self):
+        pass
+
+    def picked_up_by(self, player):
+        self.game.entities.despawn(self)
+        self.game.item_index.remove(self)
+        self.game.power_ups_picked_up += 1
+        self.player = player
+        player.addPowerUp(self) #if the inventory is full Simulation.release_item puts it back in the pool
+
+    def update(self, time_delta):
+        self.x += time_delta*(-Speed.MAX_SPEED)
+        if self.x < -PowerUps.ICON_SIZE:
+            self.game.entities.despawn(self)
+            self.game.item_index.remove(self)
+
+    def draw(self, cr, alpha=1):
+        cr.save()
+        cr.translate(lerp(self.previous_x, self.x, alpha), self.y)
+        cr.set_source_surface(self.icon, 0, 0)
+        cr.paint()
+        cr.restore()
+
+
+class Call911(PowerUp):
+    __slots__ = ()
+
+    def __init__(self, game, player=None):
+        super(Call911, self).__init__(game, player)
+        self.icon = PowerUps.CALL_911
+
+    def applyPowerUp(self):
+        self.game.generateEmergencyVehicle(self.player.vertical_position)
+
+class Hydraulics(PowerUp):
+    __slots__ = ()
+
+    def __init__(self, game, player=None):
+        super(Hydraulics, self).__init__(game, player)
+        self.icon = PowerUps.HYDRAULICS
+
+    def applyPowerUp(self):
+        self.player.hydraulics = True
+
+class Shield(PowerUp):
+    __slots__ = ()
+
+    def __init__(self, game, player=None):
+        super(Shield, self).__init__(game, player)
+        self.icon = PowerUps.SHIELD
+
+    def applyPowerUp(self):
+        self.player.shield = True
+
+class Shrink(PowerUp):
+    __slots__ = ()
+
+    def __init__(self, game, player=None):
+        super(Shrink, self).__init__(game, player)
+        self.icon = PowerUps.SHRINK
+
+    def applyPowerUp(self):
+        self.player.shrunk = True
+        self.player.height = self.player.height / 2
+        self.player.height_offset = self.player.height_offset / 2
+
+class Phaser(PowerUp):
+    __slots__ = ()
+
+    def __init__(self, game, player=None):
+        super(Phaser, self).__init__(game, player)
+        self.icon = PowerUps.PHASER
+
+    def applyPowerUp(self):
+        self.player.fire_phaser = True
+
+class Simulation:
+    MAX_NPVS = 8
+    SPAWN_DELAY = 900
+    TICK_RATE = 60 #simulation steps per second
+    MAX_STEPS_PER_ADVANCE = 5 #after a long stall drop the backlog instead of trying to catch up
+    TRUCK_DROP_RATE = 0.3 #power ups a truck in view drops per second, on average
+    CRASH_PENALTY = 60
+
+    def __init__(self, num_of_players=1, tick_rate=TICK_RATE, max_npvs=MAX_NPVS, spawn_delay=SPAWN_DELAY, vectorized_particles=ParticleManager.Particles.VECTORIZED, seed=None):
+        #Everything random in a game comes from self.random, the same seed and inputs always play out the same game
+        self.seed = seed if seed != None else random.randrange(2**32)
+        self.random = random.Random(self.seed)
+        self.num_of_players = num_of_players
+        self.tick_rate = tick_rate
+        self.vectorized_particles = vectorized_particles
+        self.tick_length = 1000.0/tick_rate #in miliseconds
+        self.max_npvs = max_npvs
+        self.npv_spawn_delay = spawn_delay
+        self.truck_drop_rate = self.TRUCK_DROP_RATE
+        self.crash_penalty = self.CRASH_PENALTY
+        self.accumulator = 0
+        self.pending_inputs = []
+        self.road = Road(0)
+        self.decals = Decals()
+        self.speed = Speed.MAX_SPEED
+        self.previous_crash_count = 0
+        self.pools = ObjectPool.Pools() #NPVs, trucks and power ups, emitters are pooled by self.particles
+        #Everything that comes and goes, despawned entities are taken out and released at the end of every step
+        self.entities = EntityStore.EntityStore()
+        self.npvs = self.entities.group("npvs", self.pools.release)
+        self.npv_index = LaneIndex(Car.bounds, RoadPositions.LANE_EDGES)
+        self.spawn_delay = 0
+        self.players = []
+        self.droped_items = self.entities.group("items", self.release_item)
+        self.item_index = LaneIndex(PowerUp.bounds, RoadPositions.LANE_EDGES)
+        self.crash_handlers = self.entities.group("crash_handlers")
+        self.particles = ParticleManager.ParticleSystem(vectorized=vectorized_particles, rng=self.random, entities=self.entities)
+        self.ticks = 0
+        self.profiler = Profiler.FrameProfiler() #disabled until someone turns it on
+        self.recording = None   #a Replay.Recording, if this game is being recorded
+        self.set_quality(0)
+        #Counters for balance tuning, see BatchSimulator.py
+        self.player_crashes = 0
+        self.npv_crashes = 0
+        self.power_ups_picked_up = 0
+        self.power_ups_used = 0
+
+        self.players.append(Player(CarModels.GALLARDO_PLAYER1 , 0, RoadPositions.LEFT_LANE, Speed.MAX_SPEED, 0, self))
+        if num_of_players > 1:
+            self.players.append(Player(CarModels.GALLARDO_PLAYER2 , 0, RoadPositions.RIGHT_LANE, Speed.MAX_SPEED, 1, self))
+
+    def apply_input(self, player_id, action, value):
+        if action == Inputs.QUALITY:
+            self.set_quality(value)
+            return
+        if player_id >= len(self.players):
+            return
+        player = self.players[player_id]
+        if action == Inputs.BRAKE:
+            player.braking = value
+        elif action == Inputs.FORWARD:
+            player.forward = value
+        elif action == Inputs.UP:
+            player.up = value
+        elif action == Inputs.DOWN:
+            player.down = value
+        elif action == Inputs.USE_POWER_UP:
+            player.usePowerUp(value)
+
+    #See QualityLevels, comes in as an Inputs.QUALITY input so recordings replay it
+    def set_quality(self, level):
+        level = max(0, min(level, QualityLevels.COUNT - 1))
+        self.quality = level
+        self.particles.quality_scale = QualityLevels.PARTICLE_SCALE[level]
+        self.skid_marks = QualityLevels.SKID_MARKS[level]
+        self.sprite_filter = QualityLevels.SPRITE_FILTER[level]
+        self.particles.sprite_filter = self.sprite_filter
+        self.far_traffic_every = QualityLevels.FAR_TRAFFIC_EVERY[level]
+        self.profiler.quality_level = level
+
+    #kind is NPV or Truck, the rest are its constructor's arguments
+    def new_npv(self, kind, *args):
+        return self.pools.acquire(kind, *args)
+
+    def spawn_npv(self, npv):
+        self.entities.spawn("npvs", npv)
+        self.npv_index.insert(npv)
+
+    #Taken out of self.npvs and released at the end of the step
+    def remove_npv(self, npv):
+        self.entities.despawn(npv)
+        self.npv_index.remove(npv)
+
+    def release_item(self, item):
+        #picked up items live on in their player's inventory until they are used
+        if item.player == None or item not in item.player.inventory:
+            self.pools.release(item)
+
+    def crash(self, player, other_object_speed):
+        player.crash_handler = PlayerCrashHandler(player, other_object_speed)
+        self.entities.spawn("crash_handlers", player.crash_handler)
+
+    def generateEmergencyVehicle(self, vertical_position):
+            self.spawn_npv(self.new_npv(NPV, CarModels.EMERGENCY_CARS[self.random.randrange(len(CarModels.EMERGENCY_CARS))], vertical_position, -20*Speed.ONE_KMH, self.random))
+
+    def generateRandomNPV(self):
+        #Select a random lane
+        random_num = self.random.randrange(3)
+        if random_num == 0:
+            lane = RoadPositions.LEFT_LANE
+        elif random_num == 1:
+            lane = RoadPositions.MIDDLE_LANE
+        else:
+            lane = RoadPositions.RIGHT_LANE
+
+        #Select a Speed
+        speed = Speed.MAX_SPEED - Speed.ONE_KMH*(self.random.randrange(20) + 5) # -5 beacause we need the npvs to always be slower than the player
+
+        #Select a car
+        random_num = self.random.randrange(100)
+        if random_num < 4:
+            self.generateEmergencyVehicle(lane)
+        elif random_num < 10:
+            self.spawn_npv(self.new_npv(Truck, CarModels.TRUCKS[self.random.randrange(len(CarModels.TRUCKS))], lane, speed, self))
+        else:
+            self.spawn_npv(self.new_npv(NPV, CarModels.AVAILABLE_CARS[self.random.randrange(len(CarModels.AVAILABLE_CARS))], lane, speed, self.random))
+
+    def advance(self, elapsed_time, inputs=()):
+        #Runs as many fixed length steps as fit in the elapsed time (in miliseconds)
+        #Returns how far we are into the next step, for draw() to interpolate with
+        self.pending_inputs.extend(inputs) #held until the next step so none are lost
+        self.accumulator += elapsed_time
+        steps = 0
+        while self.accumulator >= self.tick_length:
+            self.step(self.tick_length, self.pending_inputs)
+            self.pending_inputs = []
+            self.accumulator -= self.tick_length
+            steps += 1
+            if steps == self.MAX_STEPS_PER_ADVANCE:
+                self.accumulator = min(self.accumulator, self.tick_length)
+                break
+        return min(self.accumulator/self.tick_length, 1)
+
+    def save_state(self):
+        self.road.save_state()
+        self.decals.save_state()
+        for player in self.players:
+            player.save_state()
+        for npv in self.npvs:
+            npv.save_state()
+        for item in self.droped_items:
+            item.save_state()
+
+    def step(self, time_delta, inputs=()):
+        #time_delta is in miliseconds
+        profiler = self.profiler
+        t = profiler.start()
+        self.save_state()
+        for player_id, action, value in inputs:
+            self.apply_input(player_id, action, value)
+
+        self.road.advance(time_delta*Speed.MAX_SPEED) #self.speed)
+        self.decals.advance(time_delta*Speed.MAX_SPEED)
+        t = profiler.lap("road", t)
+
+        for player in self.players:
+            player.update(time_delta)
+        t = profiler.lap("players", t)
+
+        #Update NPVs
+        if self.spawn_delay > 0:
+            self.spawn_delay -= time_delta
+        #create new NPVs
+        if len(self.npvs) < self.max_npvs:
+            if self.spawn_delay <= 0:
+                self.generateRandomNPV()
+                self.spawn_delay = self.npv_spawn_delay
+        t = profiler.lap("npv spawn", t)
+        #Recalculate their position, the index follows every car that moved
+        for npv in self.npvs:
+            steps = self.npv_steps(npv)
+            if steps == 0:
+                continue
+            car = npv.slower_car_ahead(self.npv_index)
+            if car != None:
+                npv.overtake(car, self.npv_index)
+            if isinstance(npv, Truck):
+                npv.roll_for_drops(time_delta*steps)
+            npv.update(time_delta*steps, self.speed)
+            self.npv_index.update(npv)
+        self.stamp_skid_marks()
+        t = profiler.lap("npv update", t)
+
+
+        #Collision detection
+        #Tests are swept over the whole step so nothing tunnels through anything else however long the step is
+        #(between player and non-players)
+        npv_reach = self.npv_reach()
+        npv_boxes = dict((npv, (npv.previous_bounds(), npv.bounds())) for npv in self.npvs) #nobody moves until the collisions are done
+        for player in self.players:
+            if player.hydraulics:
+                continue
+            previous = player.previous_bounds()
+            box = player.bounds()
+            query = swept_box(previous, box, npv_reach)
+            if player.fire_phaser:
+                query = swept_box(query, (box[0], box[1], RoadPositions.COLLISION_HORIZON, box[3]))
+            for npv in self.npv_index.query(*query):
+                impact = self.check_swept_collision(previous, box, *npv_boxes[npv])
+                if impact != None:
+                    npv.wobble()
+                    if not player.shield:
+                        if not npv.crashed:
+                            x, y = player.position_at(impact)
+                            self.particles.add_new_emmitter(self.particles.new_emitter(Minus10Points, x, y, -player.speed, 0.2))
+                            player.score -= self.crash_penalty
+                            if(player.crash_handler == None):
+                                self.crash(player, npv.speed)
+                    if not npv.crashed:
+                        npv.crashed = True
+                        self.npv_crashes += 1
+                        x, y = npv.position_at(impact)
+                        self.particles.add_new_emmitter(self.particles.new_emitter(SmokeEmitter, x, y-npv.height_offset, -npv.speed, 0))
+                if player.fire_phaser:
+                    #the beam is there all at once, no need to sweep it
+                    if self.check_collision(player.horizontal_position, player.vertical_position, RoadPositions.COLLISION_HORIZON, player.height, npv.horizontal_position, npv.vertical_position, npv.width, npv.height):
+                        self.particles.add_new_emmitter(self.particles.new_emitter(SmokeEmitter, npv.horizontal_position, npv.vertical_position-npv.height_offset, 0, 0))
+                        self.remove_npv(npv)
+        t = profiler.lap("player collisions", t)
+
+        #(between non-players themselves)
+        npvs = self.entities.live("npvs") #without the ones the phasers got
+        for car1, car2, impact in self.colliding_pairs(npvs, npv_boxes, npv_reach):
+            self.npv_collision(car1, car2, impact)
+        t = profiler.lap("npv collisions", t)
+
+
+        #between players
+        for i in range(len(self.players) - 1):
+            for j in range(i+1, len(self.players)):
+                if self.players[i].hydraulics or self.players[j].hydraulics:
+                    continue
+                player1 = self.players[i]
+                player2 = self.players[j]
+                if self.check_swept_collision((player1.previous_horizontal_position, player1.previous_vertical_position, player1.height, player1.width),
+                                              (player1.horizontal_position, player1.vertical_position, player1.height, player1.width),
+                                              (player2.previous_horizontal_position, player2.previous_vertical_position, player2.height, player2.width),
+                                              (player2.horizontal_position, player2.vertical_position, player2.height, player2.width)) != None:
+                    if(self.players[i].crash_handler == None and not self.players[i].shield):
+                        self.crash(self.players[i], self.players[j].speed)
+                    if(self.players[j].crash_handler == None and not self.players[j].shield):
+                        self.crash(self.players[j], self.players[i].speed)
+        t = profiler.lap("player vs player", t)
+
+
+
+        #Update Particle Emitters
+        self.particles.update(time_delta)
+        t = profiler.lap("particles", t)
+
+        #Messages
+        current_crashed_count = 0
+        for npv in npvs:
+            if npv.crashed:
+                 current_crashed_count += 1
+
+        if current_crashed_count > self.previous_crash_count:
+            if current_crashed_count == 3:
+                self.particles.add_new_emmitter(self.particles.new_emitter(HolyShit))
+            elif current_crashed_count == 4:
+                self.particles.add_new_emmitter(self.particles.new_emitter(Mayhem))
+            elif current_crashed_count > 4:
+                self.particles.add_new_emmitter(self.particles.new_emitter(Annihilation))
+            
+        self.previous_crash_count = current_crashed_count
+
+        #items move first so the pick ups are swept over the same step as the players
+        for item in self.droped_items:
+            item.update(time_delta)
+            if item in self.item_index:
+                self.item_index.update(item)
+
+        item_reach = time_delta*Speed.MAX_SPEED
+        for player in self.players:
+            previous = player.previous_bounds()
+            box = player.bounds()
+            for item in self.item_index.query(*swept_box(previous, box, item_reach)):
+                if self.check_swept_collision(previous, box, item.previous_bounds(), item.bounds()) != None:
+                    item.picked_up_by(player)
+
+            
+        for handler in self.crash_handlers:
+            handler.update(time_delta)
+        t = profiler.lap("items and crashes", t)
+
+        #Delete NPVs that are behind us (not visible anymore)
+        for npv in self.npvs:
+            if npv.horizontal_position <= RoadPositions.BEHIND_REAR_HORIZON:
+                self.remove_npv(npv)
+        self.entities.compact()
+        profiler.lap("despawn", t)
+
+        self.ticks += 1
+        if self.recording != None:
+            self.recording.record(self.ticks - 1, inputs, self.state_hash())
+
+
+    #How many steps worth of time the npv moves this step, 0 when it sits this one out
+    #Nobody can see or hit the ones past the collision horizon yet, with far_traffic_every > 1 they catch up with a longer step every few steps
+    def npv_steps(self, npv):
+        if self.far_traffic_every > 1 and npv.horizontal_position > RoadPositions.COLLISION_HORIZON:
+            return self.far_traffic_every if self.ticks % self.far_traffic_every == 0 else 0
+        return 1
+
+    #Every skid mark goes into the decals once, the step it appears, and stays on the road from then on
+    def stamp_skid_marks(self):
+        for npv in self.npvs:
+            if npv.skid_mark != None and not npv.skid_stamped:
+                npv.skid_stamped = True
+                self.decals.stamp(npv.skid_mark, npv.horizontal_position, npv.vertical_position - npv.height_offset)
+
+    def check_collision(self, car1_x, car1_y, car1_w, car1_h, car2_x, car2_y, car2_w, car2_h):
+        #x - horizontal position
+        #y - vertical position
+        #w - width
+        #h - height
+        if(car1_x > RoadPositions.COLLISION_HORIZON or car2_x > RoadPositions.COLLISION_HORIZON): #If the cars have not yet appeared on screen then give them a chance of sorting it out
+            return False
+        return (car1_x < car2_x + car2_w) and (car1_x + car1_w > car2_x) and (car1_y < car2_y + car2_h) and (car1_y + car1_h > car2_y)
+
+    #Same as check_collision but over the whole step, boxes are (x, y, w, h)
+    #Returns the time of impact as a fraction of the step, None if they did not touch
+    def check_swept_collision(self, previous1, box1, previous2, box2):
+        if(box1[0] > RoadPositions.COLLISION_HORIZON or box2[0] > RoadPositions.COLLISION_HORIZON):
+            return None
+        return time_of_impact(previous1, box1, previous2, box2)
+
+    #How far any npv moved this step, what the swept queries have to look around them
+    def npv_reach(self):
+        reach = 0
+        for npv in self.npvs:
+            reach = max(reach, abs(npv.horizontal_position - npv.previous_horizontal_position), abs(npv.vertical_position - npv.previous_vertical_position))
+        return reach
+
+    #(car1, car2, time of impact) for every pair of npvs that collide this step
+    #Only neighbours from the index are tested, each pair once
+    def colliding_pairs(self, npvs, npv_boxes, npv_reach):
+        order = self.npv_index.order
+        pairs = []
+        for car1 in npvs:
+            previous, box = npv_boxes[car1]
+            for car2 in self.npv_index.query(*swept_box(previous, box, npv_reach)):
+                if order[car2] <= order[car1]:
+                    continue
+                impact = self.check_swept_collision(previous, box, *npv_boxes[car2])
+                if impact != None:
+                    pairs.append((car1, car2, impact))
+        return pairs
+
+    def npv_collision(self, car1, car2, impact=1):
+        if(car1.vertical_position == car2.vertical_position):
+            if(car1.horizontal_position <= car2.horizontal_position):
+                car2.hit_from_behind()
+            else:
+                car1.hit_from_behind()
+        else:
+            if (not car1.crashed) and (not car2.crashed):
+                x, y = car1.position_at(impact)
+                self.particles.add_new_emmitter(self.particles.new_emitter(SmokeEmitter, x, y-car1.height_offset, -car1.speed, 0))
+                car1.crashed = True
+                car2.crashed = True
+                self.npv_crashes += 2
+            car1.wobble()
+            car2.wobble()
+
+    #Fingerprint of everything that affects how the game plays out, two runs that agree on it every tick are the same game
+    def state_hash(self):
+        state = [self.ticks, self.road.x, self.spawn_delay, self.previous_crash_count, self.random.getstate()]
+        for player in self.players:
+            state.append((player.horizontal_position, player.vertical_position, player.rotation, player.speed, player.score,
+                          player.up, player.down, player.forward, player.braking, player.powerUpTimeOut,
+                          player.hydraulics, player.shield, player.shrunk, player.fire_phaser, player.phaser_alpha,
+                          tuple(type(powerup).__name__ for powerup in player.inventory)))
+            if player.crash_handler != None:
+                handler = player.crash_handler
+                state.append((handler.t, handler.timeout, handler.skid_position))
+        for npv in self.npvs:
+            state.append((type(npv).__name__, npv.horizontal_position, npv.vertical_position, npv.speed, npv.rotation,
+                          npv.angular_speed, npv.wobbling, npv.skiding, npv.crashed, npv.switching_to_left_lane, npv.switching_to_right_lane,
+                          npv.skid_stamped))
+        for item in self.droped_items:
+            state.append((type(item).__name__, item.x, item.y))
+        for emitter in self.particles.emitters:
+            state.append((type(emitter).__name__, emitter.x, emitter.y, emitter.done))
+            for particle in emitter.particles:
+                state.append((float(particle.x), float(particle.y), float(particle.life)))
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+    #What draw() paints, bottom to top, as (profiler phase, function(cr, alpha)) pairs
+    #Layers only read the game state, so LayerRenderer can paint them all at the same time
+    def layers(self):
+        #the lists as they are now, whatever happens to them while the layers are being painted
+        npvs = tuple(self.npvs)
+        items = tuple(self.droped_items)
+        players = tuple(self.players)
+        skid_marks = self.skid_marks
+        sprite_filter = self.sprite_filter
+
+        def road(cr, alpha):
+            self.road.draw(cr, alpha)
+            if skid_marks:
+                self.decals.draw(cr, alpha)
+
+        def traffic(cr, alpha):
+            for npv in npvs:
+                npv.draw(cr, alpha, sprite_filter)
+
+        def dropped(cr, alpha):
+            for item in items:
+                item.draw(cr, alpha)
+
+        def cars(cr, alpha):
+            for player in players:
+                player.draw(cr, alpha, sprite_filter)
+
+        def particles(cr, alpha):
+            self.particles.draw(cr, alpha)
+
+        return (("draw road", road), ("draw npvs", traffic), ("draw items", dropped), ("draw players", cars), ("draw particles", particles))
+
+    def draw(self, cr, alpha=1):
+        #alpha interpolates between the previous (0) and the current (1) simulation state
+        #REMEMBER Order is important here
+        profiler = self.profiler
+        t = profiler.start()
+        for phase, layer in self.layers():
+            layer(cr, alpha)
+            t = profiler.lap(phase, t)
@@ -0,0 +1,113 @@
+import bisect
+
+class LaneIndex:
+    #The road split into horizontal bands (lanes), each keeping its objects sorted by x
+    #An object is in every band its box touches, queries are a bisect per band instead of a scan
+    #Objects at the same x are kept in the order they were inserted so the index never depends on how it got there
+    def __init__(self, bounds, lane_edges):
+        self.bounds = bounds #function returning the (x, y, w, h) box of an object
+        self.lane_edges = lane_edges #y where one band ends and the next begins, ascending
+        self.keys = [[] for i in range(len(lane_edges) + 1)] #(x, order) of every object in the band
+        self.objects = [[] for i in range(len(lane_edges) + 1)]
+        self.placed = {} #object -> (x, first band, last band)
+        self.order = {}
+        self.next_order = 0
+        self.max_width = 0
+
+    def __len__(self):
+        return len(self.placed)
+
+    def __contains__(self, obj):
+        return obj in self.placed
+
+    def band_range(self, y, h):
+        return bisect.bisect_right(self.lane_edges, y), bisect.bisect_right(self.lane_edges, y + h)
+
+    def clear(self):
+        for band in range(len(self.keys)):
+            self.keys[band] = []
+            self.objects[band] = []
+        self.placed = {}
+        self.order = {}
+        self.next_order = 0
+
+    def rebuild(self, objects):
+        self.clear()
+        for obj in objects:
+            self.insert(obj)
+
+    #order is only given when an object is filed again, it keeps the one it had
+    def insert(self, obj, order=None):
+        if order == None:
+            order = self.next_order
+            self.next_order += 1
+        x, y, w, h = self.bounds(obj)
+        first, last = self.band_range(y, h)
+        for band in range(first, last + 1):
+            i = bisect.bisect_right(self.keys[band], (x, order))
+            self.keys[band].insert(i, (x, order))
+            self.objects[band].insert(i, obj)
+        self.placed[obj] = (x, first, last)
+        self.order[obj] = order
+        self.max_width = max(self.max_width, w)
+
+    def remove(self, obj):
+        placed = self.placed.pop(obj, None)
+        if placed == None:
+            return
+        x, first, last = placed
+        key = (x, self.order.pop(obj))
+        for band in range(first, last + 1):
+            i = bisect.bisect_left(self.keys[band], key)
+            del self.keys[band][i]
+            del self.objects[band][i]
+
+    #Must be called after an object moves. Staying in the same lanes it is only shifted past
+    #the neighbours it overtook, usually none
+    def update(self, obj):
+        placed = self.placed.get(obj)
+        if placed == None:
+            self.insert(obj)
+            return
+        old_x, first, last = placed
+        x, y, w, h = self.bounds(obj)
+        order = self.order[obj]
+        if (first, last) != self.band_range(y, h):
+            self.remove(obj)
+            self.insert(obj, order)
+            return
+        key = (x, order)
+        for band in range(first, last + 1):
+            keys = self.keys[band]
+            objects = self.objects[band]
+            i = bisect.bisect_left(keys, (old_x, order))
+            keys[i] = key
+            while i > 0 and keys[i - 1] > key:
+                keys[i], keys[i - 1] = keys[i - 1], keys[i]
+                objects[i], objects[i - 1] = objects[i - 1], objects[i]
+                i -= 1
+            while i + 1 < len(keys) and keys[i + 1] < key:
+                keys[i], keys[i + 1] = keys[i + 1], keys[i]
+                objects[i], objects[i + 1] = objects[i + 1], objects[i]
+                i += 1
+        self.placed[obj] = (x, first, last)
+
+    #The objects in the band of lane (a y) that start from x up to before end, nearest first, skip is passed over
+    def ahead(self, lane, x, end, skip=None):
+        band = bisect.bisect_right(self.lane_edges, lane)
+        keys = self.keys[band]
+        objects = self.objects[band]
+        for i in range(bisect.bisect_left(keys, (x,)), bisect.bisect_left(keys, (end,))):
+            if objects[i] is not skip:
+                yield objects[i]
+
+    #Returns the objects that may overlap the box, in insertion order. Callers still do the exact test
+    def query(self, x, y, w, h):
+        first, last = self.band_range(y, h)
+        found = {}
+        for band in range(first, last + 1):
+            keys = self.keys[band]
+            objects = self.objects[band]
+            for i in range(bisect.bisect_left(keys, (x - self.max_width,)), bisect.bisect_right(keys, (x + w, float("inf")))):
+                found[objects[i]] = self.order[objects[i]]
+        return sorted(found, key=found.get)
@@ -0,0 +1,143 @@
+import cairo
+import math
+import threading
+from collections import OrderedDict
+
+import Assets
+
+#Keeps pre-rendered rotated/scaled copies of sprites so that drawing them is a plain blit
+#instead of cairo resampling the source image with the full transform every frame
+class SpriteCache:
+    ANGLE_STEPS = 360               #a full turn is quantized into this many angles
+    SCALE_STEP = 1/32.0
+    MEMORY_CAP = 32*1024*1024       #in bytes
+
+    def __init__(self, memory_cap=MEMORY_CAP, angle_steps=ANGLE_STEPS, scale_step=SCALE_STEP):
+        self.memory_cap = memory_cap
+        self.angle_steps = angle_steps
+        self.scale_step = scale_step
+        self.enabled = True
+        self.entries = OrderedDict() #least recently used first
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock() #layers may be drawn from several threads, see LayerRenderer.py
+
+    def key(self, surface, angle, scale_x, scale_y):
+        step = int(round(angle * self.angle_steps / (2*math.pi))) % self.angle_steps
+        return (surface, step, int(round(scale_x / self.scale_step)), int(round(scale_y / self.scale_step)))
+
+    #Draws surface with its top left corner at (x, y), scaled by (scale_x, scale_y)
+    #and rotated by angle around the center of the unscaled surface
+    #filter is the cairo filter for the blit, None leaves cairo's default
+    def draw(self, cr, surface, x, y, angle=0, scale_x=1, scale_y=1, alpha=1, filter=None):
+        if angle == 0 and scale_x == 1 and scale_y == 1:
+            cr.set_source_surface(surface, x, y)
+            self.paint(cr, alpha, filter)
+            return
+        if not self.enabled:
+            self.draw_transformed(cr, surface, x, y, angle, scale_x, scale_y, alpha, filter)
+            return
+
+        key = self.key(surface, angle, scale_x, scale_y)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry != None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            else:
+                self.misses += 1
+        if entry == None:
+            #Miss: render the quantized sprite and blit that too, so a sprite looks the same whatever is in the cache
+            step, quantized_x, quantized_y = key[1:]
+            entry = self.render(surface, step * 2*math.pi / self.angle_steps, quantized_x * self.scale_step, quantized_y * self.scale_step)
+            self.insert(key, entry)
+        rendered, offset_x, offset_y = entry
+        cr.set_source_surface(rendered, x + offset_x, y + offset_y)
+        self.paint(cr, alpha, filter)
+
+    def paint(self, cr, alpha, filter=None):
+        if filter != None:
+            cr.get_source().set_filter(filter)
+        if alpha == 1:
+            cr.paint()
+        else:
+            cr.paint_with_alpha(alpha)
+
+    def transform(self, cr, surface, angle, scale_x, scale_y):
+        if angle != 0:
+            center_x = Assets.width(surface) / 2.0
+            center_y = Assets.height(surface) / 2.0
+            cr.translate(center_x, center_y)
+            cr.rotate(angle)
+            cr.translate(-center_x, -center_y)
+        cr.scale(scale_x, scale_y)
+
+    def draw_transformed(self, cr, surface, x, y, angle, scale_x, scale_y, alpha, filter=None):
+        cr.save()
+        cr.translate(x, y)
+        self.transform(cr, surface, angle, scale_x, scale_y)
+        cr.set_source_surface(surface, 0, 0)
+        self.paint(cr, alpha, filter)
+        cr.restore()
+
+    def bounding_box(self, surface, angle, scale_x, scale_y):
+        width = Assets.width(surface)
+        height = Assets.height(surface)
+        center_x = width / 2.0
+        center_y = height / 2.0
+        cos = math.cos(angle)
+        sin = math.sin(angle)
+        xs = []
+        ys = []
+        for corner_x, corner_y in ((0, 0), (width, 0), (0, height), (width, height)):
+            dx = corner_x*scale_x - center_x
+            dy = corner_y*scale_y - center_y
+            xs.append(center_x + dx*cos - dy*sin)
+            ys.append(center_y + dx*sin + dy*cos)
+        left = int(math.floor(min(xs)))
+        top = int(math.floor(min(ys)))
+        return left, top, int(math.ceil(max(xs))) - left, int(math.ceil(max(ys))) - top
+
+    def render(self, surface, angle, scale_x, scale_y):
+        left, top, width, height = self.bounding_box(surface, angle, scale_x, scale_y)
+        rendered = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(width, 1), max(height, 1))
+        cr = cairo.Context(rendered)
+        cr.translate(-left, -top)
+        self.transform(cr, surface, angle, scale_x, scale_y)
+        cr.set_source_surface(surface, 0, 0)
+        cr.paint()
+        return rendered, left, top
+
+    def insert(self, key, entry):
+        size = entry[0].get_stride() * entry[0].get_height()
+        if size > self.memory_cap:
+            return
+        with self.lock:
+            if key in self.entries: #another thread rendered it first
+                return
+            while self.memory + size > self.memory_cap:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self.memory -= old_entry[0].get_stride() * old_entry[0].get_height()
+                self.evictions += 1
+            self.entries[key] = entry
+            self.memory += size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.memory = 0
+
+    def statistics(self):
+        return {"entries": len(self.entries),
+                "memory": self.memory,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+
+default_cache = SpriteCache()
+
+def draw(cr, surface, x, y, angle=0, scale_x=1, scale_y=1, alpha=1, filter=None):
+    default_cache.draw(cr, surface, x, y, angle, scale_x, scale_y, alpha, filter)
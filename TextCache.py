@@ -0,0 +1,79 @@
+import cairo
+import math
+import threading
+from collections import OrderedDict
+
+#Keeps every piece of text rendered into its own small surface so that drawing it again is a plain blit
+#instead of cairo looking up the font and shaping the glyphs every frame
+#Entries are keyed by (text, font, size, colour), the least recently used ones go first once MAX_ENTRIES is reached
+class TextCache:
+    MAX_ENTRIES = 128
+    PADDING = 2 #room for antialiasing around the ink
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.enabled = True
+        self.entries = OrderedDict() #least recently used first
+        self.measure = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock() #layers may be drawn from several threads, see LayerRenderer.py
+
+    #Same as move_to(x, y) then show_text(text), colour is (r, g, b)
+    def draw(self, cr, text, x, y, font="Sans", size=20, colour=(1, 1, 1)):
+        if not self.enabled:
+            self.set_font(cr, font, size, colour)
+            cr.move_to(x, y)
+            cr.show_text(text)
+            return
+        key = (text, font, size, colour)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry != None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            else:
+                self.misses += 1
+                entry = self.render(text, font, size, colour)
+                self.entries[key] = entry
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        rendered, offset_x, offset_y = entry
+        cr.set_source_surface(rendered, x + offset_x, y + offset_y)
+        cr.paint()
+
+    def set_font(self, cr, font, size, colour):
+        cr.set_source_rgb(*colour)
+        cr.select_font_face(font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+        cr.set_font_size(size)
+
+    def render(self, text, font, size, colour):
+        self.set_font(self.measure, font, size, colour)
+        x_bearing, y_bearing, width, height, x_advance, y_advance = self.measure.text_extents(text)
+        #whole pixel offsets so text drawn at whole pixel positions stays sharp
+        left = int(math.floor(x_bearing)) - self.PADDING
+        top = int(math.floor(y_bearing)) - self.PADDING
+        rendered = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(int(math.ceil(width)) + 2*self.PADDING + 1, 1), max(int(math.ceil(height)) + 2*self.PADDING + 1, 1))
+        cr = cairo.Context(rendered)
+        self.set_font(cr, font, size, colour)
+        cr.move_to(-left, -top)
+        cr.show_text(text)
+        return rendered, left, top
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def statistics(self):
+        return {"entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+
+default_cache = TextCache()
+
+def draw(cr, text, x, y, font="Sans", size=20, colour=(1, 1, 1)):
+    default_cache.draw(cr, text, x, y, font, size, colour)
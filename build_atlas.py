@@ -0,0 +1,54 @@
+#Packs every sprite image (cars, power ups, skid marks and particles) into atlas.png
+#and writes atlas.json with where each one ended up. Run it again whenever a sprite changes.
+import cairo
+import json
+import os
+
+import Assets
+import Simulation #declares all the sprites with the registry
+
+ATLAS_IMAGE = "atlas.png"
+MAX_WIDTH = 2048
+PADDING = 2
+
+#Shelf packing: tallest first, left to right, a new shelf when the row is full
+def pack(sizes, max_width=MAX_WIDTH, padding=PADDING):
+    max_width = max([max_width] + [w + padding for w, h in sizes.values()])
+    placements = {}
+    x = 0
+    y = 0
+    shelf_height = 0
+    for path in sorted(sizes, key=lambda path: (-sizes[path][1], path)):
+        w, h = sizes[path]
+        if x + w > max_width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        placements[path] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    return placements, max_width, y + shelf_height
+
+def build(index_path=Assets.ATLAS_INDEX, image_path=ATLAS_IMAGE):
+    images = {}
+    for path in Assets.registry.sprite_paths:
+        images[os.path.normpath(path)] = cairo.ImageSurface.create_from_png(path)
+    sizes = dict((path, (image.get_width(), image.get_height())) for path, image in images.items())
+    placements, width, height = pack(sizes)
+
+    atlas = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    cr = cairo.Context(atlas)
+    cr.set_operator(cairo.OPERATOR_SOURCE)
+    for path, (x, y, w, h) in placements.items():
+        cr.set_source_surface(images[path], x, y)
+        cr.rectangle(x, y, w, h)
+        cr.fill()
+    atlas.write_to_png(image_path)
+
+    with open(index_path, "w") as index_file:
+        json.dump({"image": os.path.relpath(image_path, os.path.dirname(os.path.abspath(index_path))),
+                   "sprites": placements}, index_file, indent=1, sort_keys=True)
+    print("Packed %d sprites into a %dx%d atlas" % (len(placements), width, height))
+
+if __name__ == "__main__":
+    build()
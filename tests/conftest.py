@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#The game loads its images relative to where it is started from
+@pytest.fixture(autouse=True)
+def game_directory(monkeypatch):
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,54 @@
+from EntityStore import EntityStore
+
+def test_handles_stop_resolving_when_despawned():
+    store = EntityStore()
+    handle = store.spawn("npvs", "a")
+    assert store.get(handle) == "a"
+    assert store.despawn("a")
+    assert store.get(handle) == None
+    assert not store.despawn("a")
+
+def test_reused_slot_gets_a_new_generation():
+    store = EntityStore()
+    old = store.spawn("npvs", "a")
+    store.despawn("a")
+    store.compact()
+    new = store.spawn("npvs", "b")
+    assert new[0] == old[0]
+    assert new[1] != old[1]
+    assert store.get(old) == None
+    assert store.get(new) == "b"
+
+def test_despawned_entities_stay_until_compact():
+    store = EntityStore()
+    for entity in "abc":
+        store.spawn("npvs", entity)
+    store.despawn("b")
+    assert store.group("npvs") == ["a", "b", "c"]
+    assert store.live("npvs") == ["a", "c"]
+    assert store.count("npvs") == 2
+    assert not store.alive("b")
+
+def test_compact_moves_the_last_entity_into_the_hole():
+    released = []
+    store = EntityStore()
+    store.group("npvs", released.append)
+    handles = dict((entity, store.spawn("npvs", entity)) for entity in "abcd")
+    store.despawn("b")
+    store.compact()
+    assert store.group("npvs") == ["a", "d", "c"]
+    assert released == ["b"]
+    for entity in "acd":
+        assert store.get(handles[entity]) == entity
+        assert store.handle_of(entity) == handles[entity]
+
+def test_groups_compact_separately():
+    store = EntityStore()
+    store.spawn("npvs", "a")
+    store.spawn("items", "x")
+    store.spawn("npvs", "b")
+    store.despawn("a")
+    store.despawn("x")
+    store.compact()
+    assert store.group("npvs") == ["b"]
+    assert store.group("items") == []
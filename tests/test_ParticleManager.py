@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("cairo")
+pytest.importorskip("numpy")
+
+import Simulation
+from Simulation import Inputs
+
+def test_particle_backends_agree():
+    python = Simulation.Simulation(seed=5, max_npvs=30, spawn_delay=100, vectorized_particles=False)
+    vectorized = Simulation.Simulation(seed=5, max_npvs=30, spawn_delay=100, vectorized_particles=True)
+    for tick in range(1500):
+        inputs = [(0, Inputs.UP, tick % 120 < 60), (0, Inputs.DOWN, tick % 120 >= 60)] if tick % 60 == 0 else []
+        python.step(python.tick_length, inputs)
+        vectorized.step(vectorized.tick_length, inputs)
+        assert python.state_hash() == vectorized.state_hash(), "backends diverged at tick %d" % tick
+    assert len(python.particles.emitters) > 0
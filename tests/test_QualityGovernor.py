@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("cairo")
+
+from QualityGovernor import QualityGovernor
+
+def feed(governor, frame_time, frames):
+    levels = []
+    for i in range(frames):
+        level = governor.frame(frame_time)
+        if level != None:
+            levels.append(level)
+    return levels
+
+def test_goes_down_once_the_window_is_over_budget():
+    governor = QualityGovernor(10)
+    assert feed(governor, 20, QualityGovernor.WINDOW - 1) == []
+    assert governor.frame(20) == 1
+
+def test_holds_the_level_after_a_change():
+    governor = QualityGovernor(10)
+    feed(governor, 20, QualityGovernor.WINDOW)
+    assert feed(governor, 20, QualityGovernor.HOLD) == []
+    assert governor.frame(20) == 2
+
+def test_stays_put_between_headroom_and_budget():
+    governor = QualityGovernor(10)
+    feed(governor, 20, QualityGovernor.WINDOW)
+    assert feed(governor, 10*QualityGovernor.HEADROOM + 1, 10*QualityGovernor.HOLD) == []
+    assert governor.level == 1
+
+def test_comes_back_up_with_headroom():
+    governor = QualityGovernor(10)
+    feed(governor, 20, QualityGovernor.WINDOW)
+    assert feed(governor, 10*QualityGovernor.HEADROOM - 1, QualityGovernor.HOLD + 1) == [0]
+    assert [(old, new) for frame, old, new, slow in governor.transitions] == [(0, 1), (1, 0)]
+
+def test_a_few_slow_frames_do_not_count():
+    governor = QualityGovernor(10)
+    frame_times = [5]*(QualityGovernor.WINDOW - 2) + [50, 50]
+    for frame_time in frame_times:
+        assert governor.frame(frame_time) == None
+    assert governor.level == 0
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("cairo")
+
+import Replay
+import Simulation
+from Simulation import Inputs
+
+def record(vectorized_particles=False, ticks=900):
+    simulation = Simulation.Simulation(seed=11, max_npvs=20, spawn_delay=200, vectorized_particles=vectorized_particles)
+    recording = Replay.Recording.of(simulation)
+    for tick in range(ticks):
+        inputs = []
+        if tick % 45 == 0:
+            inputs.append((0, Inputs.UP, tick % 90 < 45))
+        if tick % 300 == 0:
+            inputs.append((0, Inputs.QUALITY, (tick // 300) % 5))
+        simulation.step(simulation.tick_length, inputs)
+    return simulation, recording
+
+def test_same_seed_same_game():
+    games = [Simulation.Simulation(seed=4, max_npvs=30, spawn_delay=100) for i in range(2)]
+    for tick in range(600):
+        inputs = [(0, Inputs.UP, tick % 120 < 60)] if tick % 60 == 0 else []
+        hashes = set()
+        for simulation in games:
+            simulation.step(simulation.tick_length, inputs)
+            hashes.add(simulation.state_hash())
+        assert len(hashes) == 1
+
+def test_replay_matches_every_tick():
+    simulation, recording = record()
+    assert len(recording.hashes) == recording.ticks
+    replayed, mismatch = Replay.replay(recording)
+    assert mismatch == None
+    assert replayed.state_hash() == simulation.state_hash()
+
+def test_vectorized_particles_replay():
+    pytest.importorskip("numpy")
+    simulation, recording = record(vectorized_particles=True)
+    assert Replay.replay(recording)[1] == None
+
+def test_saved_recording_replays(tmp_path):
+    simulation, recording = record(ticks=300)
+    path = str(tmp_path / "session.json")
+    recording.save(path)
+    loaded = Replay.Recording.load(path)
+    assert loaded.hashes == recording.hashes
+    assert Replay.replay(loaded)[1] == None
+
+def test_a_changed_input_is_caught():
+    simulation, recording = record(ticks=300)
+    recording.inputs.append((100, 0, Inputs.DOWN, True))
+    assert Replay.replay(recording)[1] != None
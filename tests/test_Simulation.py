@@ -0,0 +1,107 @@
+import pytest
+
+pytest.importorskip("cairo")
+
+import Assets
+import Simulation
+from Simulation import Decals, SkidMarks, Window, time_of_impact
+
+def test_marks_ahead_of_the_screen_wait_for_the_ring():
+    decals = Decals()
+    image = SkidMarks.SKID_LEFT
+    x = Window.WIDTH + Decals.MARGIN + 100
+    decals.stamp(image, x, 200)
+    assert decals.pending == []
+    assert len(decals.ahead) == 1
+    assert len(decals.stamps) == 1
+    decals.advance(50)
+    assert decals.pending == []
+    decals.advance(100 + Assets.width(image))
+    assert decals.ahead == []
+    assert decals.pending == [(image, x, 200)]
+
+def test_marks_behind_the_ring_are_dropped():
+    decals = Decals()
+    decals.stamp(SkidMarks.SKID_LEFT, -Decals.MARGIN - Assets.width(SkidMarks.SKID_LEFT), 200)
+    assert decals.pending == []
+    assert decals.ahead == []
+    assert decals.stamps == []
+
+def recovered_speed(tick_rate):
+    simulation = Simulation.Simulation(tick_rate=tick_rate, seed=1)
+    player = simulation.players[0]
+    player.speed = Simulation.Speed.MAX_SPEED / 2
+    simulation.crash(player, 0)
+    for i in range(tick_rate):
+        player.crash_handler.update(simulation.tick_length)
+    return player.speed
+
+def test_crash_recovery_does_not_depend_on_the_tick_rate():
+    assert recovered_speed(30) == pytest.approx(recovered_speed(120), rel=0.05)
+
+def drops_per_second(monkeypatch, tick_rate, seconds=300):
+    drops = []
+    monkeypatch.setattr(Simulation.Truck, "dropPowerUp", lambda truck: drops.append(truck))
+    simulation = Simulation.Simulation(tick_rate=tick_rate, seed=2)
+    truck = simulation.new_npv(Simulation.Truck, Simulation.CarModels.TRUCKS[0], Simulation.RoadPositions.MIDDLE_LANE, 0, simulation)
+    truck.horizontal_position = 500
+    for i in range(seconds*tick_rate):
+        truck.roll_for_drops(simulation.tick_length)
+    return len(drops) / float(seconds)
+
+def test_trucks_drop_at_the_same_rate_at_any_tick_rate(monkeypatch):
+    assert drops_per_second(monkeypatch, 30) == pytest.approx(Simulation.Simulation.TRUCK_DROP_RATE, rel=0.25)
+    assert drops_per_second(monkeypatch, 120) == pytest.approx(Simulation.Simulation.TRUCK_DROP_RATE, rel=0.25)
+
+def test_npvs_see_a_slow_car_behind_a_faster_one():
+    simulation = Simulation.Simulation(seed=1)
+    lane = Simulation.RoadPositions.MIDDLE_LANE
+    model = Simulation.CarModels.AVAILABLE_CARS[0]
+    npv = simulation.new_npv(Simulation.NPV, model, lane, 10, simulation.random)
+    fast = simulation.new_npv(Simulation.NPV, model, lane, 20, simulation.random)
+    slow = simulation.new_npv(Simulation.NPV, model, lane, 5, simulation.random)
+    npv.horizontal_position = 300
+    fast.horizontal_position = npv.horizontal_position + npv.width + 20
+    slow.horizontal_position = fast.horizontal_position + fast.width + 20
+    for car in (npv, fast, slow):
+        simulation.spawn_npv(car)
+    assert npv.slower_car_ahead(simulation.npv_index) is slow
+    slow.horizontal_position = npv.horizontal_position + npv.width + npv.AHEAD_DISTANCE + 10
+    simulation.npv_index.update(slow)
+    assert npv.slower_car_ahead(simulation.npv_index) == None
+
+def test_the_index_finds_every_colliding_pair():
+    simulation = Simulation.Simulation(seed=3, max_npvs=100, spawn_delay=20)
+    collisions = 0
+    for tick in range(1500):
+        simulation.step(simulation.tick_length)
+        if tick % 10 != 0:
+            continue
+        npvs = list(simulation.npvs)
+        boxes = dict((npv, (npv.previous_bounds(), npv.bounds())) for npv in npvs)
+        found = set(frozenset((car1, car2)) for car1, car2, impact in simulation.colliding_pairs(npvs, boxes, simulation.npv_reach()))
+        every = set()
+        for i, car1 in enumerate(npvs):
+            for car2 in npvs[i+1:]:
+                if simulation.check_swept_collision(boxes[car1][0], boxes[car1][1], boxes[car2][0], boxes[car2][1]) != None:
+                    every.add(frozenset((car1, car2)))
+        assert found == every
+        collisions += len(every)
+    assert collisions > 0
+
+def test_time_of_impact_head_on():
+    assert time_of_impact((0, 0, 10, 10), (100, 0, 10, 10), (50, 0, 10, 10), (50, 0, 10, 10)) == pytest.approx(0.4)
+    assert time_of_impact((0, 0, 10, 10), (50, 0, 10, 10), (100, 0, 10, 10), (50, 0, 10, 10)) == pytest.approx(0.9)
+
+def test_time_of_impact_already_overlapping():
+    assert time_of_impact((0, 0, 10, 10), (5, 0, 10, 10), (5, 5, 10, 10), (5, 5, 10, 10)) == 0
+
+def test_time_of_impact_misses():
+    #moving apart
+    assert time_of_impact((0, 0, 10, 10), (-50, 0, 10, 10), (20, 0, 10, 10), (20, 0, 10, 10)) == None
+    #passing in another lane
+    assert time_of_impact((0, 0, 10, 10), (100, 0, 10, 10), (50, 20, 10, 10), (50, 20, 10, 10)) == None
+    #stopping short
+    assert time_of_impact((0, 0, 10, 10), (30, 0, 10, 10), (50, 0, 10, 10), (50, 0, 10, 10)) == None
+    #tunneling through diagonally, the boxes are never in each other's way at the same time
+    assert time_of_impact((0, 0, 10, 10), (100, 100, 10, 10), (80, 0, 10, 10), (80, 0, 10, 10)) == None
@@ -0,0 +1,104 @@
+from SpatialIndex import LaneIndex
+
+class Box:
+    def __init__(self, x, y, w=10, h=10):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+def create_index():
+    return LaneIndex(lambda box: (box.x, box.y, box.w, box.h), [100, 200])
+
+def assert_consistent(index):
+    for band in range(len(index.keys)):
+        assert index.keys[band] == sorted(index.keys[band])
+        for key, box in zip(index.keys[band], index.objects[band]):
+            assert key == (box.x, index.order[box])
+
+def test_update_keeps_the_bands_sorted():
+    index = create_index()
+    boxes = [Box(x, 50) for x in (0, 100, 200, 300)]
+    for box in boxes:
+        index.insert(box)
+    boxes[0].x = 250
+    index.update(boxes[0])
+    boxes[3].x = -50
+    index.update(boxes[3])
+    assert_consistent(index)
+    assert index.objects[0] == [boxes[3], boxes[1], boxes[2], boxes[0]]
+
+def test_update_moves_objects_between_lanes():
+    index = create_index()
+    box = Box(0, 50)
+    index.insert(box)
+    box.y = 150
+    index.update(box)
+    assert index.objects[0] == []
+    assert index.objects[1] == [box]
+    box.y = 195     #now touching both the middle and the bottom lane
+    index.update(box)
+    assert index.objects[1] == [box]
+    assert index.objects[2] == [box]
+    assert_consistent(index)
+
+def test_update_inserts_objects_it_does_not_have():
+    index = create_index()
+    box = Box(0, 50)
+    index.update(box)
+    assert box in index
+
+def test_remove():
+    index = create_index()
+    boxes = [Box(0, 50), Box(0, 195), Box(20, 50)]
+    for box in boxes:
+        index.insert(box)
+    index.remove(boxes[1])
+    assert boxes[1] not in index
+    assert len(index) == 2
+    assert index.objects[1] == []
+    assert index.objects[2] == []
+    assert_consistent(index)
+
+def test_ties_keep_the_insertion_order():
+    index = create_index()
+    first = Box(100, 50)
+    second = Box(100, 50)
+    index.insert(first)
+    index.insert(second)
+    second.x = 200
+    index.update(second)
+    second.x = 100
+    index.update(second)
+    assert index.objects[0] == [first, second]
+    first.y = 150
+    index.update(first)
+    first.y = 50
+    index.update(first)
+    assert index.objects[0] == [first, second]
+
+def test_ahead_walks_the_lane_nearest_first():
+    index = create_index()
+    behind = Box(0, 50)
+    car = Box(100, 50)
+    near = Box(150, 50)
+    far = Box(300, 50)
+    other_lane = Box(120, 150)
+    for box in (behind, far, car, near, other_lane):
+        index.insert(box)
+    assert list(index.ahead(50, car.x, 1000, car)) == [near, far]
+    assert list(index.ahead(50, car.x, 300)) == [car, near]
+    assert list(index.ahead(150, 0, 1000)) == [other_lane]
+    assert list(index.ahead(50, 301, 1000)) == []
+    assert list(index.ahead(250, 0, 1000)) == []
+
+def test_query_finds_overlapping_boxes_in_insertion_order():
+    index = create_index()
+    late = Box(40, 50)
+    early = Box(0, 150, 50)
+    far = Box(500, 50)
+    index.insert(early)
+    index.insert(late)
+    index.insert(far)
+    found = index.query(30, 90, 20, 70)
+    assert found == [early, late]
@@ -0,0 +1,39 @@
+import pytest
+
+cairo = pytest.importorskip("cairo")
+
+from SpriteCache import SpriteCache
+
+def sprite():
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 40, 20)
+    cr = cairo.Context(surface)
+    cr.set_source_rgb(1, 0, 0)
+    cr.rectangle(0, 0, 30, 20)
+    cr.fill()
+    cr.set_source_rgb(0, 0, 1)
+    cr.rectangle(30, 0, 10, 20)
+    cr.fill()
+    return surface
+
+def draw(cache, surface, angle, scale):
+    target = cairo.ImageSurface(cairo.FORMAT_ARGB32, 100, 100)
+    cr = cairo.Context(target)
+    cache.draw(cr, surface, 30, 40, angle, scale, scale, 0.8)
+    target.flush()
+    return bytes(target.get_data())
+
+def test_a_miss_draws_what_a_hit_does():
+    cache = SpriteCache()
+    surface = sprite()
+    missed = draw(cache, surface, 0.3001, 1.01)
+    hit = draw(cache, surface, 0.3001, 1.01)
+    assert cache.statistics()["misses"] == 1
+    assert cache.statistics()["hits"] == 1
+    assert missed == hit
+
+def test_a_sprite_too_big_to_cache_still_draws_quantized():
+    surface = sprite()
+    uncached = draw(SpriteCache(memory_cap=0), surface, 0.3001, 1.01)
+    cache = SpriteCache()
+    draw(cache, surface, 0.3, 1.0)
+    assert draw(cache, surface, 0.3001, 1.01) == uncached